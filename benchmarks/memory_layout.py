@@ -0,0 +1,77 @@
+"""Compare the memory used by the old dict-based model layout and the slotted one, both with IDs.
+
+    python benchmarks/memory_layout.py --definitions 1000000
+"""
+import argparse
+import gc
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Definition, Folder  # noqa: E402
+
+
+legacy_ids = itertools.count(1)
+
+
+# The layout before __slots__ and interning, kept here only for comparison. It carries the same
+# integer IDs as the current classes, so the difference measured is the layout alone.
+class LegacyDefinition:
+    def __init__(self, phrase, meaning):
+        self.id = next(legacy_ids)
+        self.phrase = phrase
+        self.meaning = meaning
+
+
+class LegacyFolder:
+    def __init__(self, name, color=None):
+        self.id = next(legacy_ids)
+        self.name = name
+        self.color = color
+        self.subfolders = []
+        self.definitions = []
+
+
+def build(folder_class, definition_class, definitions, per_folder):
+    root = folder_class('Root')
+    for start in range(0, definitions, per_folder):
+        # Names and colors arrive as fresh strings, as they do from a parser
+        folder = folder_class(''.join(['Chapter ', str(start % 50)]), ''.join(['#', '2b00ff']))
+        folder.definitions = [definition_class(f'phrase {i}', f'meaning of phrase {i}')
+                              for i in range(start, min(start + per_folder, definitions))]
+        root.subfolders.append(folder)
+    return root
+
+
+def measure(label, folder_class, definition_class, definitions, per_folder):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    root = build(folder_class, definition_class, definitions, per_folder)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{label:<8} {current / 2 ** 20:9.1f} MiB  {current / definitions:7.1f} B/definition  '
+          f'build {elapsed:6.2f}s')
+    del root
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--definitions', type=int, default=1_000_000)
+    parser.add_argument('--per-folder', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f'{args.definitions} definitions, {args.per_folder} per folder')
+    legacy = measure('legacy', LegacyFolder, LegacyDefinition, args.definitions, args.per_folder)
+    slotted = measure('slotted', Folder, Definition, args.definitions, args.per_folder)
+    print(f'saved    {(legacy - slotted) / 2 ** 20:9.1f} MiB  ({100 * (legacy - slotted) / legacy:.0f}%)')
+
+
+if __name__ == '__main__':
+    main()
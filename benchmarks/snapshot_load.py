@@ -0,0 +1,124 @@
+"""Compare loading a library from data.json and from the binary snapshot, checking both round-trip.
+
+    python benchmarks/snapshot_load.py --definitions 1000000
+    python benchmarks/snapshot_load.py --definitions 200000 --meaning-words 300
+
+The last part compares the memory held by a loaded tree with every meaning resident and with
+meanings left in a mapped file (BinaryStore with lazy_meanings).
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_stream import load_folder  # noqa: E402
+from models import Folder  # noqa: E402
+from snapshot import SnapshotError, encode_snapshot, load_snapshot  # noqa: E402
+from storage import BinaryStore  # noqa: E402
+
+WORDS = 'the of energy mass force field wave charge a to is in which that motion object'.split()
+
+
+def build(definitions, per_folder, meaning_words):
+    # Nested folders, colors, empty folders and non-ASCII text, so the round trip covers them
+    root = Folder('Root')
+    chapter = None
+    for start in range(0, definitions, per_folder):
+        if start % (per_folder * 10) == 0:
+            chapter = Folder(f'Chapter {start // (per_folder * 10)}', '#2b00ff')
+            chapter.subfolders.append(Folder('Empty'))
+            root.subfolders.append(chapter)
+        folder = Folder(f'Section {start // per_folder} – ü')
+        folder.add_definitions([(f'phrase {i}', f'meaning of phrase {i} with “quotes” and\nnewlines '
+                                 + ' '.join(random.choices(WORDS, k=meaning_words)))
+                                for i in range(start, min(start + per_folder, definitions))])
+        chapter.subfolders.append(folder)
+    return root
+
+
+def timed(label, load, path):
+    gc.collect()
+    started = time.perf_counter()
+    root, extras = load(path)
+    elapsed = time.perf_counter() - started
+    print(f'{label:<16} {elapsed:8.3f}s  {os.path.getsize(path) / 2 ** 20:8.1f} MiB')
+    return root, extras, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--definitions', type=int, default=1_000_000)
+    parser.add_argument('--per-folder', type=int, default=100)
+    parser.add_argument('--meaning-words', type=int, default=0, help='extra words of text in every meaning')
+    args = parser.parse_args()
+
+    data = build(args.definitions, args.per_folder, args.meaning_words).to_dict()
+    data['journal_seq'] = 42
+    with tempfile.TemporaryDirectory() as directory:
+        json_path = os.path.join(directory, 'data.json')
+        snapshot_path = os.path.join(directory, 'data.snap')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        encoded = encode_snapshot(data)
+        with open(snapshot_path, 'wb') as f:
+            f.write(encoded)
+
+        print(f'{args.definitions} definitions, {args.per_folder} per folder')
+        json_root, json_extras, json_time = timed('data.json', load_folder, json_path)
+        snapshot_root, snapshot_extras, snapshot_time = timed('data.snap', load_snapshot, snapshot_path)
+        print(f'speedup          {json_time / snapshot_time:8.1f}x')
+
+        # Round trip: both files must give back exactly the tree they were written from
+        expected = dict(data)
+        del expected['journal_seq']
+        assert json_root.to_dict() == expected, 'data.json does not round-trip'
+        assert snapshot_root.to_dict() == expected, 'data.snap does not round-trip'
+        assert snapshot_extras['journal_seq'] == json_extras['journal_seq'] == 42
+        assert encode_snapshot({**snapshot_root.to_dict(), 'journal_seq': 42}) == encoded, 'encoding is not stable'
+
+        # A flipped byte anywhere after the header must be caught by the checksum
+        corrupted = bytearray(encoded)
+        corrupted[random.randrange(64, len(corrupted))] ^= 0x01
+        with open(snapshot_path, 'wb') as f:
+            f.write(corrupted)
+        try:
+            load_snapshot(snapshot_path)
+        except SnapshotError:
+            pass
+        else:
+            raise AssertionError('corrupted snapshot was loaded')
+        print('round trip       ok')
+
+        with open(snapshot_path, 'wb') as f:
+            f.write(encoded)
+        resident = resident_memory(lambda: BinaryStore(snapshot_path, lazy_meanings=False))
+        print(f'resident meanings {resident / 2 ** 20:8.1f} MiB')
+        # The first lazy load moves the meanings out to a blob file; measure the second one
+        BinaryStore(snapshot_path, lazy_meanings=True).load()
+        mapped = resident_memory(lambda: BinaryStore(snapshot_path, lazy_meanings=True))
+        print(f'mapped meanings   {mapped / 2 ** 20:8.1f} MiB  ({resident / mapped:.1f}x less)')
+
+
+def resident_memory(open_store):
+    # Python memory held by a loaded tree, for either way of keeping meanings
+    gc.collect()
+    store = open_store()
+    tracemalloc.start()
+    root = store.load()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    store.close()
+    del root
+    return current
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Measure application startup: module import, load_data and first paint of the main window.
+
+    python benchmarks/startup.py --definitions 100000 --repeat 5
+    python benchmarks/startup.py --meaning-words 60   # longer meanings
+    python benchmarks/startup.py --max-first-paint-ms 1500   # exit 1 above the budget
+
+Every run is a fresh interpreter, so import costs are not hidden by modules already loaded.
+Without a display, Qt's offscreen platform is used.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ('import', 'load_data', 'first_paint', 'cli_import', 'pandas_loaded')
+WORDS = 'the of energy mass force field wave charge a to is in which that motion object'.split()
+MEANING_WORDS = 25  # About 150 characters, a sentence or two like the meanings of a real library
+
+
+def write_library(path, definitions, per_folder, meaning_words=MEANING_WORDS):
+    rng = random.Random(definitions)
+    root = {'id': 1, 'name': 'Root', 'color': None, 'subfolders': [], 'definitions': []}
+    next_id = 2
+    for start in range(0, definitions, per_folder):
+        folder = {'id': next_id, 'name': f'Chapter {start // per_folder}', 'color': None,
+                  'subfolders': [], 'definitions': []}
+        next_id += 1
+        for i in range(start, min(start + per_folder, definitions)):
+            meaning = ' '.join([f'meaning of phrase {i}'] + rng.choices(WORDS, k=meaning_words))
+            folder['definitions'].append({'id': next_id, 'phrase': f'phrase {i}', 'meaning': meaning})
+            next_id += 1
+        root['subfolders'].append(folder)
+    root['journal_seq'] = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(root, f)
+
+
+def child_gui():
+    # Runs inside the measured interpreter; prints the timings as JSON
+    started = time.perf_counter()
+    import main
+    from PyQt6.QtCore import QEvent, QObject, QTimer
+    timings = {'import': time.perf_counter() - started}
+
+    load_data = main.MainWindow.load_data
+
+    def timed_load_data(self):
+        load_started = time.perf_counter()
+        load_data(self)
+        timings['load_data'] = time.perf_counter() - load_started
+
+    main.MainWindow.load_data = timed_load_data
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Type.Paint and 'first_paint' not in timings:
+                timings['first_paint'] = time.perf_counter() - started
+                QTimer.singleShot(0, app.quit)
+            return False
+
+    app = main.QApplication(sys.argv[:1])
+    first_paint = FirstPaint()
+    app.installEventFilter(first_paint)
+    window = main.MainWindow()
+    window.show()
+    QTimer.singleShot(10_000, app.quit)  # Give up if nothing is ever painted
+    app.exec()
+    timings['pandas_loaded'] = 'pandas' in sys.modules
+    window.store.close()
+    print(json.dumps(timings))
+
+
+def child_cli():
+    started = time.perf_counter()
+    import cli  # noqa: F401
+    print(json.dumps({'cli_import': time.perf_counter() - started,
+                      'qt_loaded': any(name.startswith('PyQt6') for name in sys.modules)}))
+
+
+def run_child(mode, cwd):
+    env = dict(os.environ, PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE='1')
+    if sys.platform.startswith('linux') and not env.get('DISPLAY') and not env.get('WAYLAND_DISPLAY'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode],
+                            cwd=cwd, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--definitions', type=int, default=100_000)
+    parser.add_argument('--per-folder', type=int, default=100)
+    parser.add_argument('--meaning-words', type=int, default=MEANING_WORDS,
+                        help=f'words of text in every meaning (default: {MEANING_WORDS})')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-first-paint-ms', type=float, help='fail when the median first paint is slower')
+    parser.add_argument('--child', choices=('gui', 'cli'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child == 'gui':
+        return child_gui()
+    if args.child == 'cli':
+        return child_cli()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_library(os.path.join(directory, 'data.json'), args.definitions, args.per_folder, args.meaning_words)
+        runs = []
+        for _ in range(args.repeat):
+            timings = run_child('gui', directory)
+            cli_timings = run_child('cli', directory)
+            if cli_timings['qt_loaded']:
+                print('warning: importing cli loaded PyQt6')
+            timings['cli_import'] = cli_timings['cli_import']
+            runs.append(timings)
+
+    print(f'{args.definitions} definitions of {args.meaning_words} meaning words, median of {args.repeat} runs')
+    for stage in STAGES[:-1]:
+        values = [run[stage] for run in runs if stage in run]
+        if values:
+            print(f'{stage:<12} {statistics.median(values) * 1000:8.1f} ms')
+    if any(run['pandas_loaded'] for run in runs):
+        print('warning: pandas was imported during startup')
+    if args.max_first_paint_ms is not None:
+        first_paint = statistics.median(run.get('first_paint', float('inf')) for run in runs) * 1000
+        if first_paint > args.max_first_paint_ms:
+            print(f'first paint {first_paint:.1f} ms is over the {args.max_first_paint_ms:.1f} ms budget')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
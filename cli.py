@@ -0,0 +1,238 @@
+"""Command-line access to the definitions library, without the GUI.
+
+    python -m cli stats
+    python -m cli search "entropy" --limit 20
+    python -m cli search "rate of change" --ranked --limit 10
+    python -m cli import words.csv --folder "Root/Physics" --policy skip
+    python -m cli export --folder "Root/Physics" --format jsonl > physics.jsonl
+    python -m cli export --filter energy -o energy.xlsx
+    python -m cli compact
+
+Nothing here imports PyQt6; pandas is only loaded by the import command. import and compact
+take the library's lock file and fail while the GUI has it open, or wait for it with --wait.
+"""
+import argparse
+import json
+import os
+import sys
+
+from export import EXPORT_FORMATS, export_folder, write_json_tree, write_stream
+from models import Folder, iter_definitions, iter_folders
+from search_index import (MERGE_POLICIES, RANKED_RESULT_LIMIT, PhraseIndex, RankedIndex, closest_definitions,
+                          duplicate_groups, merge_rows, normalize_phrase)
+from storage import DATA_FILE, open_store
+
+
+def find_folder(root_folder, path, create=False, store=None):
+    # Resolves a "Root/A/B" path by folder name, creating missing folders when asked
+    names = [name for name in path.split('/') if name]
+    if names and names[0] == root_folder.name:
+        names = names[1:]
+    folder = root_folder
+    for name in names:
+        child = next((subfolder for subfolder in folder.subfolders if subfolder.name == name), None)
+        if child is None:
+            if not create:
+                raise SystemExit(f'No such folder: {path}')
+            child = Folder(name)
+            folder.subfolders.append(child)
+            store.record('add_folder', folder.id, id=child.id, name=name, color=None)
+        folder = child
+    return folder
+
+
+def folder_path(root_folder, folder):
+    for candidate, path in iter_folders(root_folder):
+        if candidate is folder:
+            return path
+
+
+def tsv_field(text):
+    return text.replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+
+
+def write_row(out, definition, path, as_json):
+    if as_json:
+        out.write(json.dumps({'id': definition.id, 'folder': path, 'phrase': definition.phrase,
+                              'meaning': definition.meaning}, ensure_ascii=False))
+        out.write('\n')
+    else:
+        out.write(f'{tsv_field(path)}\t{tsv_field(definition.phrase)}\t{tsv_field(definition.meaning)}\n')
+
+
+def cmd_stats(store, root_folder, args):
+    folders = definitions = 0
+    rows = []
+    for folder, path in iter_folders(root_folder):
+        folders += 1
+        definitions += len(folder.definitions)
+        rows.extend((definition, path) for definition in folder.definitions)
+    groups = duplicate_groups(rows)
+    print(f'file          {args.data}')
+    print(f'folders       {folders:,}')
+    print(f'definitions   {definitions:,}')
+    print(f'duplicates    {len(groups):,} phrases ({sum(map(len, groups)):,} definitions)')
+    print(f'size          {os.path.getsize(args.data) if os.path.exists(args.data) else 0:,} bytes')
+    if hasattr(store, 'journal_size'):
+        print(f'journal       {store.journal_size():,} bytes')
+
+
+def ranked_rows(store, root_folder, query, limit):
+    if store.text_search:
+        return store.iter_ranked(query, limit=limit)
+    ranked, paths = RankedIndex(not store.lazy_meanings), {}
+    for folder, path in iter_folders(root_folder):
+        ranked.add_folder(folder, path)
+        for definition in folder.definitions:
+            ranked.add(definition)
+            paths[definition] = path
+    return ((definition, paths[definition]) for _, definition in ranked.top(query, limit))
+
+
+def cmd_search(store, root_folder, args):
+    if args.ranked:
+        rows = ranked_rows(store, root_folder, args.query, args.limit or RANKED_RESULT_LIMIT)
+    elif store.text_search:
+        rows = store.iter_search(args.query)
+    else:
+        # A single query does not pay for building the trigram index; scan once instead
+        query = args.query.lower()
+        rows = ((definition, path) for definition, path in iter_definitions(root_folder)
+                if query in definition.phrase.lower() or query in definition.meaning.lower())
+    found = False
+    for count, (definition, path) in enumerate(rows):
+        if args.limit is not None and count >= args.limit:
+            break
+        write_row(sys.stdout, definition, path, args.json)
+        found = True
+    if not found:
+        suggestion = closest_phrase(store, root_folder, args.query)
+        if suggestion is not None:
+            print(f'no matches; did you mean "{suggestion}"?', file=sys.stderr)
+
+
+def closest_phrase(store, root_folder, query):
+    if store.text_search:
+        return next((definition.phrase for definition, _ in store.iter_similar(query)), None)
+    # As with search, one lookup does not pay for building the BK-tree; compare every phrase
+    found = closest_definitions((definition for definition, _ in iter_definitions(root_folder)), query)
+    return found[0].phrase if found else None
+
+
+def cmd_export(store, root_folder, args):
+    folder = find_folder(root_folder, args.folder)
+    path = folder_path(root_folder, folder)
+    if args.output not in (None, '-'):
+        count = export_folder(args.output, folder, path, args.format, args.filter)
+        print(f'exported {count:,} definitions', file=sys.stderr)
+    elif args.format == 'json':
+        write_json_tree(sys.stdout, folder)
+        sys.stdout.write('\n')
+    elif args.format == 'xlsx':
+        raise SystemExit('XLSX export needs an output file (-o)')
+    else:
+        write_stream(sys.stdout, args.format or 'jsonl', folder, path, args.filter)
+
+
+def cmd_import(store, root_folder, args):
+    from tabular import frame_rows, read_chunks
+
+    folder = find_folder(root_folder, args.folder, create=True, store=store)
+    phrases = PhraseIndex()
+    for definition in folder.definitions:
+        phrases.add(normalize_phrase(definition.phrase), definition)
+    added = updated = skipped = 0
+    for frame, _ in read_chunks(args.file, args.file.rsplit('.', 1)[-1].lower()):
+        phrase_col = args.phrase_column or frame.columns[0]
+        meaning_col = args.meaning_column or frame.columns[1]
+        rows, updates, chunk_skipped = merge_rows(phrases, frame_rows(frame, phrase_col, meaning_col), args.policy)
+        for definition, meaning in updates:
+            definition.meaning = meaning
+        if updates:
+            store.record('edit_definitions', folder.id,
+                         definitions=[[d.id, d.phrase, d.meaning] for d, _ in updates])
+        if rows:
+            new_definitions = folder.add_definitions(rows)
+            for definition in new_definitions:
+                phrases.add(normalize_phrase(definition.phrase), definition)
+            store.record('add_definitions', folder.id,
+                         definitions=[[d.phrase, d.meaning, d.id] for d in new_definitions])
+        added += len(rows)
+        updated += len(updates)
+        skipped += chunk_skipped
+    print(f'added {added:,}, overwrote {updated:,}, skipped {skipped:,}', file=sys.stderr)
+    if store.needs_compaction():
+        store.compact(root_folder)
+
+
+def cmd_compact(store, root_folder, args):
+    store.compact(root_folder)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cli', description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DATA_FILE, help=f'library file (default: {DATA_FILE})')
+    parser.add_argument('--lazy-meanings', action='store_true',
+                        help='for a .snap library, keep meanings in the mapped side file and read them on '
+                             'demand; the first such run moves them there, so it takes the lock like import')
+    parser.add_argument('--wait', action='store_true',
+                        help='when another process (e.g. the GUI) has the library open for writing, wait for it '
+                             'to close instead of failing; only import and compact write')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('stats', help='count folders, definitions and duplicate phrases')
+
+    search = commands.add_parser('search', help='print definitions whose phrase or meaning contains a query')
+    search.add_argument('query')
+    search.add_argument('--limit', type=int)
+    search.add_argument('--json', action='store_true', help='one JSON object per line instead of TSV')
+    search.add_argument('--ranked', action='store_true',
+                        help=f'best matches for the words of the query first (BM25), at most --limit or '
+                             f'{RANKED_RESULT_LIMIT}')
+
+    export = commands.add_parser('export', help='write a folder and its subfolders')
+    export.add_argument('--folder', default='Root')
+    export.add_argument('--format', choices=tuple(EXPORT_FORMATS),
+                        help='default: from the output file extension, or jsonl on stdout')
+    export.add_argument('--filter', help='only definitions whose phrase, meaning or folder contains this')
+    export.add_argument('-o', '--output', help='output file (default: stdout)')
+
+    import_ = commands.add_parser('import', help='add the rows of a CSV or XLSX file to a folder')
+    import_.add_argument('file')
+    import_.add_argument('--folder', default='Root', help='created if missing')
+    import_.add_argument('--phrase-column', help='default: the first column')
+    import_.add_argument('--meaning-column', help='default: the second column')
+    import_.add_argument('--policy', choices=MERGE_POLICIES, default='skip',
+                         help='what to do with a phrase that is already in the folder')
+
+    commands.add_parser('compact', help='fold the journal into the data file')
+    return parser
+
+
+COMMANDS = {
+    'stats': cmd_stats,
+    'search': cmd_search,
+    'export': cmd_export,
+    'import': cmd_import,
+    'compact': cmd_compact,
+}
+WRITING_COMMANDS = ('import', 'compact')
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    store = open_store(args.data, lazy_meanings=args.lazy_meanings or None)
+    try:
+        if (args.command in WRITING_COMMANDS or args.lazy_meanings) and not store.lock_writer(args.wait):
+            raise SystemExit(f'{args.data} is open for writing in another process, such as the GUI; '
+                             f'close it or pass --wait')
+        COMMANDS[args.command](store, store.load(), args)
+    except BrokenPipeError:
+        # The reader went away, e.g. `| head`; don't let the flush at exit complain again
+        sys.stdout = open(os.devnull, 'w')
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
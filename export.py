@@ -0,0 +1,107 @@
+# Streaming export of a folder and its subfolders. Rows are written as the tree is walked,
+# so memory use does not grow with the size of the library.
+import csv
+import json
+
+from models import iter_definitions
+
+EXPORT_FIELDS = ('phrase', 'meaning', 'folder_path')
+
+
+def iter_rows(folder, path='Root', query=None):
+    # (phrase, meaning, folder path) rows, optionally only those whose phrase, meaning or
+    # folder path contains the query (case-insensitive)
+    if query:
+        query = query.lower()
+    for definition, definition_path in iter_definitions(folder, path):
+        if (not query or query in definition.phrase.lower() or query in definition.meaning.lower()
+                or query in definition_path.lower()):
+            yield definition.phrase, definition.meaning, definition_path
+
+
+def write_csv(f, rows):
+    writer = csv.writer(f)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+    return count
+
+
+def write_jsonl(f, rows):
+    count = 0
+    for count, row in enumerate(rows, 1):
+        f.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+        f.write('\n')
+    return count
+
+
+def write_xlsx(file_name, rows):
+    # Write-only workbooks stream rows to disk instead of keeping every cell in memory
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Definitions')
+    sheet.append(EXPORT_FIELDS)
+    count = 0
+    for count, row in enumerate(rows, 1):
+        sheet.append(row)
+    workbook.save(file_name)
+    return count
+
+
+def write_json_tree(f, folder, indent=4, level=0):
+    # Same document as json.dump(folder.to_dict(), f, indent=4), written one definition
+    # at a time instead of building the dict tree first. Returns the number of definitions.
+    pad, inner = ' ' * (indent * level), ' ' * (indent * (level + 1))
+    f.write('{\n')
+    for key in ('id', 'name', 'color'):
+        f.write(f'{inner}{json.dumps(key)}: {json.dumps(getattr(folder, key))},\n')
+    count = 0
+    f.write(f'{inner}"subfolders": [')
+    for i, subfolder in enumerate(folder.subfolders):
+        f.write(f'{"," if i else ""}\n{inner}{" " * indent}')
+        count += write_json_tree(f, subfolder, indent, level + 2)
+    f.write(f'\n{inner}],\n' if folder.subfolders else '],\n')
+    f.write(f'{inner}"definitions": [')
+    item_pad = inner + ' ' * indent
+    for i, definition in enumerate(folder.definitions):
+        text = json.dumps(definition.to_dict(), indent=indent).replace('\n', '\n' + item_pad)
+        f.write(f'{"," if i else ""}\n{item_pad}{text}')
+        count += 1
+    f.write(f'\n{inner}]\n' if folder.definitions else ']\n')
+    f.write(f'{pad}}}')
+    return count
+
+
+EXPORT_FORMATS = {
+    'csv': 'CSV Files (*.csv)',
+    'xlsx': 'Excel Files (*.xlsx)',
+    'jsonl': 'JSON Lines Files (*.jsonl)',
+    'json': 'JSON Files (*.json)',
+}
+
+
+def export_folder(file_name, folder, path='Root', file_format=None, query=None):
+    # Writes a folder and its subfolders to file_name; the format defaults to the file extension.
+    # JSON keeps the folder structure (and ignores query); the other formats write one row per definition.
+    file_format = file_format or file_name.rsplit('.', 1)[-1].lower()
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {file_format}')
+    if file_format == 'xlsx':
+        return write_xlsx(file_name, iter_rows(folder, path, query))
+    with open(file_name, 'w', encoding='utf-8', newline='') as f:
+        if file_format == 'json':
+            count = write_json_tree(f, folder)
+            f.write('\n')
+            return count
+        return write_stream(f, file_format, folder, path, query)
+
+
+def write_stream(f, file_format, folder, path='Root', query=None):
+    # Row formats written to an already open text file, e.g. stdout
+    if file_format == 'csv':
+        return write_csv(f, iter_rows(folder, path, query))
+    if file_format == 'jsonl':
+        return write_jsonl(f, iter_rows(folder, path, query))
+    raise ValueError(f'Unsupported export format: {file_format}')
@@ -0,0 +1,212 @@
+import codecs
+import json
+import os
+import re
+from json.decoder import scanstring
+
+from models import Definition, Folder
+
+
+CHUNK_SIZE = 1 << 16
+PROGRESS_EVERY_BYTES = 1 << 20  # Report progress roughly once per MiB read
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+SCALAR = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null')
+LITERALS = {'true': True, 'false': False, 'null': None}
+DECODER = json.JSONDecoder()
+
+
+class LoadProgress:
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.folders = 0
+        self.definitions = 0
+
+
+# Pull tokenizer over a UTF-8 file that only keeps one chunk of text in memory.
+# Tokens are structural characters, or ('value', v) for strings, numbers and literals.
+class JsonTokenizer:
+    def __init__(self, f, progress, on_progress=None, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.progress = progress
+        self.on_progress = on_progress
+        self.chunk_size = chunk_size
+        self.reported_bytes = 0
+
+    def fill(self):
+        raw = self.f.read(self.chunk_size)
+        self.eof = not raw
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(raw, final=self.eof)
+        self.pos = 0
+        self.progress.bytes_read += len(raw)
+        if self.on_progress is not None and (
+                self.eof or self.progress.bytes_read - self.reported_bytes >= PROGRESS_EVERY_BYTES):
+            self.reported_bytes = self.progress.bytes_read
+            self.on_progress(self.progress)
+
+    def skip_whitespace(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError('Unexpected end of JSON data')
+            self.fill()
+
+    def read_value(self):
+        # Decodes one complete value with the C scanner, e.g. a whole definition object
+        self.skip_whitespace()
+        while True:
+            try:
+                value, self.pos = DECODER.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # The value may continue in the next chunk
+                if self.eof:
+                    raise
+                self.fill()
+
+    def next(self):
+        char = self.skip_whitespace()
+        if char in '{}[]:,':
+            self.pos += 1
+            return char
+        if char == '"':
+            while True:
+                try:
+                    value, self.pos = scanstring(self.buffer, self.pos + 1)
+                    return ('value', value)
+                except json.JSONDecodeError:
+                    # The string may continue in the next chunk
+                    if self.eof:
+                        raise
+                    self.fill()
+        while True:
+            match = SCALAR.match(self.buffer, self.pos)
+            if match is not None and (match.end() < len(self.buffer) or self.eof):
+                break
+            if self.eof:
+                raise ValueError(f'Invalid JSON at offset {self.progress.bytes_read}')
+            self.fill()
+        self.pos = match.end()
+        text = match.group()
+        if text in LITERALS:
+            return ('value', LITERALS[text])
+        return ('value', json.loads(text))
+
+
+def skip_value(tokens, token):
+    depth = 0
+    while True:
+        if token in ('{', '['):
+            depth += 1
+        elif token in ('}', ']'):
+            depth -= 1
+        if depth == 0:
+            return
+        token = tokens.next()
+
+
+def value_of(tokens, token):
+    if isinstance(token, tuple):
+        return token[1]
+    skip_value(tokens, token)
+    return None
+
+
+def expect(token, expected):
+    if token != expected:
+        raise ValueError(f'Expected {expected!r} in JSON data, got {token!r}')
+
+
+def iter_array(tokens, token):
+    # Yields the first token of every element of the array opened by token
+    expect(token, '[')
+    token = tokens.next()
+    if token == ']':
+        return
+    while True:
+        yield token
+        token = tokens.next()
+        if token == ']':
+            return
+        expect(token, ',')
+        token = tokens.next()
+
+
+def iter_object(tokens, token):
+    # Yields (key, first token of value) for every member of the object opened by token
+    expect(token, '{')
+    token = tokens.next()
+    if token == '}':
+        return
+    while True:
+        if not isinstance(token, tuple):
+            raise ValueError(f'Expected a key in JSON data, got {token!r}')
+        expect(tokens.next(), ':')
+        yield token[1], tokens.next()
+        token = tokens.next()
+        if token == '}':
+            return
+        expect(token, ',')
+        token = tokens.next()
+
+
+def iter_values(tokens, token):
+    # Yields every element of the array opened by token, each decoded in one step
+    expect(token, '[')
+    if tokens.skip_whitespace() == ']':
+        tokens.pos += 1
+        return
+    while True:
+        yield tokens.read_value()
+        token = tokens.next()
+        if token == ']':
+            return
+        expect(token, ',')
+
+
+def read_definitions(tokens, token, progress):
+    definitions = []
+    for data in iter_values(tokens, token):
+        definitions.append(Definition.from_dict(data))
+        progress.definitions += 1
+    return definitions
+
+
+def read_folder(tokens, token, progress, extras=None):
+    fields = {'id': None, 'color': None, 'subfolders': [], 'definitions': []}
+    for key, token in iter_object(tokens, token):
+        if key == 'subfolders' and token == '[':
+            fields[key] = [read_folder(tokens, item, progress) for item in iter_array(tokens, token)]
+        elif key == 'definitions' and token == '[':
+            fields[key] = read_definitions(tokens, token, progress)
+        elif key in ('id', 'name', 'color'):
+            fields[key] = value_of(tokens, token)
+        else:
+            value = value_of(tokens, token)
+            if extras is not None:
+                extras[key] = value
+    folder = Folder(fields['name'], fields['color'], id=fields['id'])
+    folder.subfolders = fields['subfolders']
+    folder.definitions = fields['definitions']
+    if extras is not None:
+        extras['id'] = fields['id']
+    progress.folders += 1
+    return folder
+
+
+def load_folder(path, on_progress=None):
+    # Builds the Folder tree straight from the file, without an intermediate dict tree.
+    # Returns the root folder and any other top-level keys of the document.
+    progress = LoadProgress(os.path.getsize(path))
+    extras = {}
+    with open(path, 'rb') as f:
+        tokens = JsonTokenizer(f, progress, on_progress)
+        root_folder = read_folder(tokens, tokens.next(), progress, extras)
+    return root_folder, extras
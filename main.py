@@ -1,55 +1,292 @@
 import sys
-import json
-import random
-import pandas as pd
+import html
+import threading
+import time
+from bisect import bisect_right
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget,
-    QHBoxLayout, QPushButton, QLineEdit, QTextEdit, QFileDialog, QMessageBox, QTableWidget,
-    QTableWidgetItem, QLabel, QDialog, QInputDialog, QColorDialog, QGridLayout, QScrollArea, QCheckBox,QComboBox,QToolBar
+    QHBoxLayout, QPushButton, QLineEdit, QTextEdit, QFileDialog, QMessageBox,
+    QLabel, QDialog, QInputDialog, QColorDialog, QComboBox, QToolBar,
+    QTableView, QSplashScreen, QProgressDialog, QListView, QStackedWidget
 )
 from PyQt6.QtWidgets import QStyle
-from PyQt6.QtCore import Qt, QSize
-from PyQt6.QtGui import QFont
-from PyQt6.QtGui import QIcon, QFont, QColor, QAction
+from PyQt6.QtCore import (
+    Qt, QSize, QAbstractListModel, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+)
+from PyQt6.QtGui import QFont, QAction
+from export import EXPORT_FORMATS, export_folder
+from models import Folder, iter_definitions
+from reviews import GRADES, REVIEWS_SUFFIX, ReviewQueue, ReviewStore, sample_tree, shuffle_stream
+from search_index import MERGE_POLICIES, DefinitionCatalog, closest_definitions
+from storage import DATA_FILE, open_store
+from tabular import RowSelection, frame_rows, read_chunks
+
+
+SEARCH_DEBOUNCE_MS = 150  # Quiet period after the last keystroke before a search starts
+SEARCH_BATCH_SIZE = 500  # Results streamed to the table per batch
+SAVE_COALESCE_MS = 300  # Save requests within this window become one snapshot write
+PREVIEW_ROW_LIMIT = 100_000  # Rows shown in the import preview; the rest are imported unseen
+IMPORT_MAX_PENDING_CHUNKS = 2  # Chunks the import reader may run ahead of the GUI thread
+MERGE_POLICY_LABELS = {
+    'skip': 'Skip the new row',
+    'overwrite': 'Overwrite the existing meaning',
+    'keep_both': 'Keep both',
+}
+SEARCH_MODE_LABELS = {
+    'substring': 'Contains the text',
+    'ranked': 'Best matches first',
+    'fuzzy': 'Tolerate typos (closest phrases)',
+}
+SAVE_STATUS_TEXT = {
+    'dirty': 'Unsaved changes',
+    'saving': 'Saving...',
+    'saved': 'All changes saved',
+    'error': 'Failed to save data',
+}
+
+
+# Table model that reads Definition objects lazily, only for the rows a view asks for.
+# Rows are either definitions or (definition, folder_path) tuples when with_folder is set.
+class DefinitionTableModel(QAbstractTableModel):
+    def __init__(self, rows=(), with_folder=False, parent=None):
+        super().__init__(parent)
+        self.rows = rows
+        self.with_folder = with_folder
+        self.headers = ['Phrase', 'Meaning', 'Folder'] if with_folder else ['Phrase', 'Meaning']
 
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def definition_at(self, row):
+        return self.rows[row][0] if self.with_folder else self.rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        column = index.column()
+        if column == 2:
+            return self.rows[index.row()][1]
+        definition = self.definition_at(index.row())
+        return definition.phrase if column == 0 else definition.meaning
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+
+# Subfolders of one folder for an icon-mode list view. Switching folders only resets the model;
+# the view lays out and paints the items it shows, all sharing one icon.
+class FolderListModel(QAbstractListModel):
+    def __init__(self, icon, parent=None):
+        super().__init__(parent)
+        self.icon = icon
+        self.folders = []
 
-DATA_FILE = 'data.json'
+    def set_folders(self, folders):
+        self.beginResetModel()
+        self.folders = folders
+        self.endResetModel()
 
-# Data Models
-class Definition:
-    def __init__(self, phrase, meaning):
-        self.phrase = phrase
-        self.meaning = meaning
+    def folder_at(self, row):
+        return self.folders[row]
 
-    def to_dict(self):
-        return {'phrase': self.phrase, 'meaning': self.meaning}
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.folders)
 
-    @staticmethod
-    def from_dict(data):
-        return Definition(data['phrase'], data['meaning'])
-
-
-class Folder:
-    def __init__(self, name, color=None):
-        self.name = name
-        self.color = color  # Store color as a hex string
-        self.subfolders = []
-        self.definitions = []
-
-    def to_dict(self):
-        return {
-            'name': self.name,
-            'color': self.color,
-            'subfolders': [folder.to_dict() for folder in self.subfolders],
-            'definitions': [definition.to_dict() for definition in self.definitions]
-        }
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return self.folders[index.row()].name
+        if role == Qt.ItemDataRole.DecorationRole:
+            return self.icon
+        return None
+
+
+class SearchWorkerSignals(QObject):
+    batch = pyqtSignal(int, list)
+    finished = pyqtSignal(int)
+
+
+# Runs one query on the thread pool, emitting results in batches tagged with its generation
+class SearchWorker(QRunnable):
+    def __init__(self, generation, search, query):
+        super().__init__()
+        self.generation = generation
+        self.search = search
+        self.query = query
+        self.cancelled = False
+        self.signals = SearchWorkerSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_cancelled(self):
+        return self.cancelled
+
+    def run(self):
+        batch = []
+        for row in self.search(self.query, cancelled=self.is_cancelled):
+            if self.cancelled:
+                return
+            batch.append(row)
+            if len(batch) >= SEARCH_BATCH_SIZE:
+                self.signals.batch.emit(self.generation, batch)
+                batch = []
+        if not self.cancelled:
+            self.signals.batch.emit(self.generation, batch)
+            self.signals.finished.emit(self.generation)
+
+
+# Debounces queries and runs them off the GUI thread. Every new query cancels the running
+# worker and bumps the generation, so batches from out-of-date queries are dropped.
+class SearchService(QObject):
+    started = pyqtSignal()
+    results = pyqtSignal(list)
+    finished = pyqtSignal()
+
+    def __init__(self, search, debounce_ms=SEARCH_DEBOUNCE_MS, parent=None):
+        super().__init__(parent)
+        self.search = search
+        self.generation = 0
+        self.query = ''
+        self.worker = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.start_search)
+
+    def submit(self, query, immediate=False):
+        self.cancel()
+        self.query = query
+        if immediate:
+            self.start_search()
+        else:
+            self.timer.start()
+
+    def cancel(self):
+        self.timer.stop()
+        self.generation += 1
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def start_search(self):
+        self.generation += 1
+        self.worker = SearchWorker(self.generation, self.search, self.query)
+        self.worker.signals.batch.connect(self.on_batch)
+        self.worker.signals.finished.connect(self.on_finished)
+        self.started.emit()
+        QThreadPool.globalInstance().start(self.worker)
+
+    def on_batch(self, generation, rows):
+        if generation == self.generation:
+            self.results.emit(rows)
+
+    def on_finished(self, generation):
+        if generation == self.generation:
+            self.worker = None
+            self.finished.emit()
+
+
+def definition_table_view(model):
+    table = QTableView()
+    table.setModel(model)
+    table.horizontalHeader().setStretchLastSection(True)
+    table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+    return table
+
+
+# Preview of DataFrame chunks that reads cells on demand and keeps the Select column in a bitmap
+class PreviewTableModel(QAbstractTableModel):
+    def __init__(self, df, parent=None):
+        super().__init__(parent)
+        self.frames = []
+        self.offsets = []  # First row of each frame
+        self.rows = 0
+        self.selection = RowSelection()
+        self.phrase_col = self.meaning_col = None
+        self.headers = ['Select', 'Phrase', 'Meaning']
+        self.append_frame(df)
+
+    def append_frame(self, df):
+        if not len(df):
+            return
+        self.beginInsertRows(QModelIndex(), self.rows, self.rows + len(df) - 1)
+        self.frames.append(df)
+        self.offsets.append(self.rows)
+        self.rows += len(df)
+        self.selection.resize(self.rows)
+        self.endInsertRows()
+
+    def set_columns(self, phrase_col, meaning_col):
+        self.phrase_col, self.meaning_col = phrase_col, meaning_col
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 1), self.index(self.rowCount() - 1, 2))
+
+    def cell(self, row, column):
+        frame_index = bisect_right(self.offsets, row) - 1
+        return self.frames[frame_index][column].iat[row - self.offsets[frame_index]]
+
+    def set_range(self, start, stop, selected):
+        self.selection.set_range(start, stop, selected)
+        if stop > start:
+            self.dataChanged.emit(self.index(start, 0), self.index(stop - 1, 0),
+                                  [Qt.ItemDataRole.CheckStateRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if column == 0:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if self.selection[index.row()] else Qt.CheckState.Unchecked
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return str(self.cell(index.row(), self.phrase_col if column == 1 else self.meaning_col))
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if index.column() != 0 or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        self.selection[index.row()] = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
 
-    @staticmethod
-    def from_dict(data):
-        folder = Folder(data['name'], data.get('color'))
-        folder.subfolders = [Folder.from_dict(sf) for sf in data.get('subfolders', [])]
-        folder.definitions = [Definition.from_dict(d) for d in data.get('definitions', [])]
-        return folder
 
 class DataPreviewDialog(QDialog):
     def __init__(self, df, parent=None):
@@ -57,6 +294,7 @@ class DataPreviewDialog(QDialog):
         self.setWindowTitle('Preview Data')
         self.df = df
         self.selected_data = []
+        self.complete = True
         self.init_ui()
 
     def init_ui(self):
@@ -73,13 +311,35 @@ class DataPreviewDialog(QDialog):
         layout.addWidget(QLabel("Select Meaning Column:"))
         layout.addWidget(self.column_combo_meaning)
 
+        # What to do with rows whose phrase is already in the folder
+        self.policy_combo = QComboBox()
+        for policy in MERGE_POLICIES:
+            self.policy_combo.addItem(MERGE_POLICY_LABELS[policy], policy)
+        layout.addWidget(QLabel("If a Phrase Already Exists:"))
+        layout.addWidget(self.policy_combo)
+
+        self.rows_label = QLabel()
+        layout.addWidget(self.rows_label)
+
         # Table preview with selectable rows
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(['Select', 'Phrase', 'Meaning'])
+        self.model = PreviewTableModel(self.df, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         layout.addWidget(self.table)
 
+        # Bulk selection buttons
+        selection_layout = QHBoxLayout()
+        for label, handler in [('Select All', lambda: self.select_all(True)),
+                               ('Select None', lambda: self.select_all(False)),
+                               ('Check Highlighted', lambda: self.select_highlighted(True)),
+                               ('Uncheck Highlighted', lambda: self.select_highlighted(False))]:
+            button = QPushButton(label)
+            button.clicked.connect(handler)
+            selection_layout.addWidget(button)
+        layout.addLayout(selection_layout)
+
         # Import and cancel buttons
         button_layout = QHBoxLayout()
         self.import_button = QPushButton('Import Selected')
@@ -99,29 +359,200 @@ class DataPreviewDialog(QDialog):
         self.column_combo_meaning.currentIndexChanged.connect(self.update_table_preview)
 
     def update_table_preview(self):
-        self.table.setRowCount(len(self.df))
-        phrase_col = self.column_combo_phrase.currentText()
-        meaning_col = self.column_combo_meaning.currentText()
+        self.model.set_columns(self.column_combo_phrase.currentText(), self.column_combo_meaning.currentText())
+        self.update_rows_label()
+
+    def append_frame(self, df):
+        self.model.append_frame(df)
+        self.update_rows_label()
 
-        for row in range(len(self.df)):
-            select_item = QCheckBox()
-            select_item.setChecked(True)
-            self.table.setCellWidget(row, 0, select_item)
-            self.table.setItem(row, 1, QTableWidgetItem(str(self.df[phrase_col][row])))
-            self.table.setItem(row, 2, QTableWidgetItem(str(self.df[meaning_col][row])))
+    def set_complete(self, complete):
+        self.complete = complete
+        self.update_rows_label()
+
+    def update_rows_label(self):
+        text = f'{self.model.rowCount():,} rows'
+        if not self.complete:
+            text += ' loaded so far; rows beyond the preview are imported with the same columns'
+        self.rows_label.setText(text)
+
+    def select_all(self, selected):
+        self.model.set_range(0, self.model.rowCount(), selected)
+
+    def select_highlighted(self, selected):
+        # Highlighted rows arrive as ranges, so large drag or shift-click selections stay cheap
+        for selection_range in self.table.selectionModel().selection():
+            self.model.set_range(selection_range.top(), selection_range.bottom() + 1, selected)
 
     def get_selected_data(self):
         phrase_col = self.column_combo_phrase.currentText()
         meaning_col = self.column_combo_meaning.currentText()
 
-        for row in range(self.table.rowCount()):
-            if self.table.cellWidget(row, 0).isChecked():
-                phrase = str(self.df[phrase_col][row])
-                meaning = str(self.df[meaning_col][row])
-                self.selected_data.append((phrase, meaning))
+        mask = self.model.selection.mask()
+        for frame, offset in zip(self.model.frames, self.model.offsets):
+            self.selected_data.extend(frame_rows(frame, phrase_col, meaning_col, mask[offset:offset + len(frame)]))
         return self.selected_data
 
 
+class ImportWorkerSignals(QObject):
+    chunk = pyqtSignal(object, object)
+    finished = pyqtSignal()
+    failed = pyqtSignal(str)
+
+
+# Reads spreadsheet chunks on the thread pool. It may only run IMPORT_MAX_PENDING_CHUNKS
+# ahead of the GUI thread, which hands a permit back with chunk_done for every chunk it consumes.
+class ImportWorker(QRunnable):
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+        self.cancelled = False
+        self.permits = threading.Semaphore(IMPORT_MAX_PENDING_CHUNKS)
+        self.signals = ImportWorkerSignals()
+
+    def cancel(self):
+        self.cancelled = True
+        self.permits.release()
+
+    def chunk_done(self):
+        self.permits.release()
+
+    def run(self):
+        try:
+            for frame, progress in self.chunks:
+                self.permits.acquire()
+                if self.cancelled:
+                    return
+                self.signals.chunk.emit(frame, progress)
+            if not self.cancelled:
+                self.signals.finished.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        finally:
+            self.chunks.close()
+
+
+# Streams a CSV/XLSX file into the preview and then into a folder. The first chunk is read
+# up front for the column names; the rest arrive from an ImportWorker. Once the preview
+# holds PREVIEW_ROW_LIMIT rows the reader is paused until the user accepts or cancels.
+class TabularImport(QObject):
+    def __init__(self, window, file_name, file_type):
+        super().__init__(window)
+        self.window = window
+        self.folder = window.current_folder
+        self.chunks = read_chunks(file_name, file_type)
+        self.worker = None
+        self.queued = []
+        self.importing = False
+        self.reading = True
+        self.done = False
+        self.imported = 0
+        self.updated = 0
+        self.skipped = 0
+        self.started = None
+        self.progress_dialog = None
+
+    def run(self):
+        first, _ = next(self.chunks, (None, None))
+        if first is None:
+            QMessageBox.information(self.window, 'Info', 'The file contains no rows.')
+            return
+        self.preview = DataPreviewDialog(first, self.window)
+        self.preview.set_complete(False)
+        self.worker = ImportWorker(self.chunks)
+        self.worker.signals.chunk.connect(self.on_chunk)
+        self.worker.signals.finished.connect(self.on_finished)
+        self.worker.signals.failed.connect(self.on_failed)
+        QThreadPool.globalInstance().start(self.worker)
+
+        if self.preview.exec() != QDialog.DialogCode.Accepted:
+            self.worker.cancel()
+            self.done = True
+            self.deleteLater()
+            return
+        self.phrase_col = self.preview.column_combo_phrase.currentText()
+        self.meaning_col = self.preview.column_combo_meaning.currentText()
+        self.policy = self.preview.policy_combo.currentData()
+        self.importing = True
+        self.started = time.perf_counter()
+        self.progress_dialog = QProgressDialog('Importing...', 'Cancel', 0, 1000, self.window)
+        self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.canceled.connect(self.cancel)
+
+        self.add_rows(self.preview.get_selected_data())
+        queued, self.queued = self.queued, []
+        for frame, progress in queued:
+            self.import_frame(frame, progress)
+        if not self.reading:
+            self.finish()
+
+    def on_chunk(self, frame, progress):
+        if self.done:
+            return
+        if self.importing:
+            self.import_frame(frame, progress)
+        elif self.preview.model.rowCount() < PREVIEW_ROW_LIMIT:
+            self.preview.append_frame(frame)
+            self.worker.chunk_done()
+        else:
+            # Keep the permit, so the reader stops until the preview is closed
+            self.queued.append((frame, progress))
+
+    def import_frame(self, frame, progress):
+        self.add_rows(frame_rows(frame, self.phrase_col, self.meaning_col))
+        self.worker.chunk_done()
+        elapsed = max(time.perf_counter() - self.started, 1e-6)
+        self.progress_dialog.setLabelText(f'Imported {self.imported:,} rows ({self.imported / elapsed:,.0f} rows/s)')
+        if progress is None:
+            self.progress_dialog.setMaximum(0)
+        else:
+            self.progress_dialog.setValue(int(progress * 1000))
+
+    def add_rows(self, rows):
+        added, updated, skipped = self.window.add_definitions(self.folder, rows, self.policy)
+        self.imported += added
+        self.updated += updated
+        self.skipped += skipped
+
+    def on_finished(self):
+        self.reading = False
+        if self.done:
+            return
+        if self.importing:
+            self.finish()
+        else:
+            self.preview.set_complete(True)
+
+    def on_failed(self, message):
+        self.reading = False
+        if self.done:
+            return
+        QMessageBox.warning(self.window, 'Error', f'Failed to import data: {message}')
+        if self.importing:
+            self.finish()
+        else:
+            self.preview.set_complete(True)
+
+    def cancel(self):
+        self.worker.cancel()
+        self.finish()
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        self.progress_dialog.canceled.disconnect(self.cancel)
+        self.progress_dialog.close()
+        self.window.update_content()
+        if self.updated or self.skipped:
+            QMessageBox.information(
+                self.window, 'Import',
+                f'Imported {self.imported:,} new rows, overwrote {self.updated:,} and skipped {self.skipped:,} '
+                f'rows whose phrase was already in the folder.')
+        self.deleteLater()
+
+
 class DefinitionDialog(QDialog):
     def __init__(self, parent=None, definition=None):
         super().__init__(parent)
@@ -158,12 +589,44 @@ class DefinitionDialog(QDialog):
         self.setLayout(layout)
 
 
+# Picks one entry of a list by position. Unlike QInputDialog.getItem, which returns the chosen
+# text, it tells apart entries whose labels are the same.
+class ChoiceDialog(QDialog):
+    def __init__(self, title, prompt, labels, current=0, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(prompt))
+        self.combo = QComboBox()
+        self.combo.addItems(labels)
+        self.combo.setCurrentIndex(current)
+        layout.addWidget(self.combo)
+
+        btn_layout = QHBoxLayout()
+        ok_btn = QPushButton('OK')
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton('Cancel')
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(ok_btn)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+    @staticmethod
+    def choose(parent, title, prompt, labels, current=0):
+        # Index of the chosen entry, or None when cancelled
+        dialog = ChoiceDialog(title, prompt, labels, current, parent)
+        if dialog.exec() and dialog.combo.currentIndex() >= 0:
+            return dialog.combo.currentIndex()
+        return None
+
+
 # Search Dialog
 class SearchDialog(QDialog):
-    def __init__(self, parent, root_folder):
+    def __init__(self, parent, source):
         super().__init__(parent)
         self.setWindowTitle('Search Definitions')
-        self.root_folder = root_folder
+        self.source = source
         self.init_ui()
 
     def init_ui(self):
@@ -174,47 +637,80 @@ class SearchDialog(QDialog):
         self.search_input.textChanged.connect(self.perform_search)
         layout.addWidget(self.search_input)
 
-        self.result_table = QTableWidget()
-        self.result_table.setColumnCount(3)
-        self.result_table.setHorizontalHeaderLabels(['Phrase', 'Meaning', 'Folder'])
-        self.result_table.horizontalHeader().setStretchLastSection(True)
+        self.mode = 'substring'
+        self.mode_combo = QComboBox()
+        for mode, label in SEARCH_MODE_LABELS.items():
+            self.mode_combo.addItem(label, mode)
+        self.mode_combo.currentIndexChanged.connect(self.set_mode)
+        layout.addWidget(self.mode_combo)
+
+        # "Did you mean" link, offered when a plain search finds nothing
+        self.suggestion = ''
+        self.suggestion_label = QLabel()
+        self.suggestion_label.linkActivated.connect(lambda link: self.search_input.setText(self.suggestion))
+        self.suggestion_label.hide()
+        layout.addWidget(self.suggestion_label)
+
+        self.result_model = DefinitionTableModel([], with_folder=True)
+        self.result_table = definition_table_view(self.result_model)
         layout.addWidget(self.result_table)
 
+        flashcards_btn = QPushButton('Flashcards from Results')
+        flashcards_btn.clicked.connect(
+            lambda: self.parent().open_result_flashcards(self.search(self.search_input.text())))
+        layout.addWidget(flashcards_btn)
+
+        self.search_service = SearchService(self.search, parent=self)
+        self.search_service.started.connect(self.clear_results)
+        self.search_service.results.connect(self.result_model.append_rows)
+        self.search_service.finished.connect(self.search_finished)
+        self.finished.connect(self.search_service.cancel)
+
+        self.suggest_service = SearchService(self.source.iter_similar, parent=self)
+        self.suggest_service.results.connect(self.show_suggestion)
+        self.finished.connect(self.suggest_service.cancel)
+
         self.setLayout(layout)
-        self.definitions = self.collect_definitions(self.root_folder)
-        self.perform_search()
-
-    def collect_definitions(self, folder, path='Root'):
-        defs = []
-        current_path = f"{path}/{folder.name}" if folder != self.root_folder else path
-        for definition in folder.definitions:
-            defs.append((definition, current_path))
-        for subfolder in folder.subfolders:
-            defs.extend(self.collect_definitions(subfolder, current_path))
-        return defs
+        self.search_service.submit('', immediate=True)
+
+    def search(self, query, cancelled=None):
+        # Runs on the search thread; an empty query lists everything in every mode
+        if self.mode == 'ranked' and query:
+            return self.source.iter_ranked(query, cancelled)
+        if self.mode == 'fuzzy' and query:
+            return self.source.iter_similar(query, cancelled)
+        return self.source.iter_search(query, cancelled)
+
+    def set_mode(self):
+        self.mode = self.mode_combo.currentData()
+        self.search_service.submit(self.search_input.text(), immediate=True)
 
     def perform_search(self):
-        query = self.search_input.text().lower()
-        results = []
-        for definition, folder_path in self.definitions:
-            if query in definition.phrase.lower() or query in definition.meaning.lower():
-                results.append((definition, folder_path))
-        self.result_table.setRowCount(len(results))
-        for row, (definition, folder_path) in enumerate(results):
-            phrase_item = QTableWidgetItem(definition.phrase)
-            meaning_item = QTableWidgetItem(definition.meaning)
-            folder_item = QTableWidgetItem(folder_path)
-            self.result_table.setItem(row, 0, phrase_item)
-            self.result_table.setItem(row, 1, meaning_item)
-            self.result_table.setItem(row, 2, folder_item)
+        self.search_service.submit(self.search_input.text())
+
+    def clear_results(self):
+        self.suggest_service.cancel()
+        self.suggestion_label.hide()
+        self.result_model.set_rows([])
+
+    def search_finished(self):
+        query = self.search_input.text()
+        if query and self.mode != 'fuzzy' and not self.result_model.rowCount():
+            self.suggest_service.submit(query, immediate=True)
+
+    def show_suggestion(self, rows):
+        if rows and self.suggestion_label.isHidden():
+            self.suggestion = rows[0][0].phrase
+            self.suggestion_label.setText(f'Did you mean <a href="#">{html.escape(self.suggestion)}</a>?')
+            self.suggestion_label.show()
 
 
 # All Definitions Dialog
 class AllDefinitionsDialog(QDialog):
-    def __init__(self, parent, root_folder):
+    def __init__(self, parent, source):
         super().__init__(parent)
         self.setWindowTitle('All Words and Definitions')
-        self.root_folder = root_folder
+        self.source = source
         self.init_ui()
 
     def init_ui(self):
@@ -227,52 +723,51 @@ class AllDefinitionsDialog(QDialog):
         layout.addWidget(self.filter_input)
 
         # Table to display definitions
-        self.def_table = QTableWidget()
-        self.def_table.setColumnCount(3)
-        self.def_table.setHorizontalHeaderLabels(['Phrase', 'Meaning', 'Folder'])
-        self.def_table.horizontalHeader().setStretchLastSection(True)
+        self.def_model = DefinitionTableModel([], with_folder=True)
+        self.def_table = definition_table_view(self.def_model)
         layout.addWidget(self.def_table)
 
+        flashcards_btn = QPushButton('Flashcards from Results')
+        flashcards_btn.clicked.connect(
+            lambda: self.parent().open_result_flashcards(self.source.iter_filter(self.filter_input.text())))
+        layout.addWidget(flashcards_btn)
+
+        self.filter_service = SearchService(self.source.iter_filter, parent=self)
+        self.filter_service.started.connect(lambda: self.def_model.set_rows([]))
+        self.filter_service.results.connect(self.def_model.append_rows)
+        self.finished.connect(self.filter_service.cancel)
+
         self.setLayout(layout)
-        self.definitions = self.collect_definitions(self.root_folder)
-        self.update_table()
-
-    def collect_definitions(self, folder, path='Root'):
-        defs = []
-        current_path = f"{path}/{folder.name}" if folder != self.root_folder else path
-        for definition in folder.definitions:
-            defs.append((definition, current_path))
-        for subfolder in folder.subfolders:
-            defs.extend(self.collect_definitions(subfolder, current_path))
-        return defs
+        self.filter_service.submit('', immediate=True)
 
     def update_table(self):
-        query = self.filter_input.text().lower()
-        filtered_defs = []
-        for definition, folder_path in self.definitions:
-            if (query in definition.phrase.lower() or
-                query in definition.meaning.lower() or
-                query in folder_path.lower()):
-                filtered_defs.append((definition, folder_path))
-        self.def_table.setRowCount(len(filtered_defs))
-        for row, (definition, folder_path) in enumerate(filtered_defs):
-            phrase_item = QTableWidgetItem(definition.phrase)
-            meaning_item = QTableWidgetItem(definition.meaning)
-            folder_item = QTableWidgetItem(folder_path)
-            self.def_table.setItem(row, 0, phrase_item)
-            self.def_table.setItem(row, 1, meaning_item)
-            self.def_table.setItem(row, 2, folder_item)
+        self.filter_service.submit(self.filter_input.text())
+
+
+# Phrases that occur more than once anywhere in the library
+class DuplicateReportDialog(QDialog):
+    def __init__(self, parent, source):
+        super().__init__(parent)
+        self.setWindowTitle('Duplicate Phrases')
+        groups = source.duplicate_groups()
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f'{len(groups):,} phrases appear more than once '
+                                f'({sum(map(len, groups)):,} definitions)'))
+        rows = [row for group in groups for row in group]
+        layout.addWidget(definition_table_view(DefinitionTableModel(rows, with_folder=True, parent=self)))
+        self.setLayout(layout)
 
 
 # Flashcard Dialog
+# Cards are drawn one at a time from an iterator, e.g. sample_tree or shuffled search results
 class FlashcardDialog(QDialog):
-    def __init__(self, definitions, parent=None):
+    def __init__(self, cards, reviews, parent=None, due=()):
         super().__init__(parent)
         self.setWindowTitle('Flashcards')
-        self.definitions = definitions
-        self.current_index = -1
+        self.queue = ReviewQueue(cards, reviews, due)
+        self.current = None
+        self.reviewed = 0
         self.init_ui()
-        random.shuffle(self.definitions)
         self.next_flashcard()
 
     def init_ui(self):
@@ -291,33 +786,54 @@ class FlashcardDialog(QDialog):
         button_layout = QHBoxLayout()
         self.show_meaning_btn = QPushButton('Show Meaning')
         self.show_meaning_btn.clicked.connect(self.show_meaning)
-        self.next_btn = QPushButton('Next')
-        self.next_btn.clicked.connect(self.next_flashcard)
         button_layout.addWidget(self.show_meaning_btn)
-        button_layout.addWidget(self.next_btn)
+        # One button per answer; the card comes back sooner the harder it was
+        for grade in GRADES:
+            grade_btn = QPushButton(grade.capitalize())
+            grade_btn.clicked.connect(lambda checked, grade=grade: self.answer(grade))
+            button_layout.addWidget(grade_btn)
 
         layout.addLayout(button_layout)
+
+        self.status_label = QLabel('')
+        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.status_label)
         self.setLayout(layout)
 
     def show_meaning(self):
-        if 0 <= self.current_index < len(self.definitions):
-            meaning = self.definitions[self.current_index].meaning
-            self.meaning_label.setText(meaning)
+        if self.current is not None:
+            self.meaning_label.setText(self.current.meaning)
+
+    def answer(self, grade):
+        if self.current is not None:
+            self.queue.answer(GRADES[grade], time.time())
+            self.reviewed += 1
+            self.next_flashcard()
 
     def next_flashcard(self):
-        self.current_index += 1
-        if self.current_index >= len(self.definitions):
-            QMessageBox.information(self, 'Info', 'No more flashcards.')
-            self.close()
+        top = self.queue.peek(time.time())
+        if top is None or top[0] > time.time():
+            message = 'No more flashcards due.'
+            if top is not None:
+                message += f' The next one is due {time.strftime("%Y-%m-%d %H:%M", time.localtime(top[0]))}.'
+            QMessageBox.information(self, 'Info', message)
+            self.current = None
+            QTimer.singleShot(0, self.close)
             return
-        phrase = self.definitions[self.current_index].phrase
-        self.phrase_label.setText(phrase)
+        self.current = top[1]
+        self.phrase_label.setText(self.current.phrase)
         self.meaning_label.setText('')
+        self.status_label.setText(f'{self.reviewed} reviewed')
+
+
+# Relays save status from the snapshot writer thread to the GUI thread
+class SaveStatus(QObject):
+    changed = pyqtSignal(str)
 
 
 # Main Application Window
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, on_progress=None):
         super().__init__()
         self.setWindowTitle('Definition Manager')
         self.resize(1000, 700)
@@ -326,7 +842,25 @@ class MainWindow(QMainWindow):
         self.current_folder = self.root_folder
         self.folder_stack = [self.root_folder]
 
+        self.save_status = SaveStatus(self)
+        self.save_status.changed.connect(self.show_save_status)
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(SAVE_COALESCE_MS)
+        self.save_timer.timeout.connect(self.save_data)
+        self.reviews = None
+
+        self.store = open_store(DATA_FILE, on_status=self.save_status.changed.emit, on_progress=on_progress)
+        if not self.store.lock_writer():
+            # Two writers would overwrite each other's journal records
+            QMessageBox.critical(None, 'Error', f'{DATA_FILE} is already open in another window or is being '
+                                                f'changed by the command-line tool.')
+            sys.exit(1)
         self.load_data()
+        self.catalog = DefinitionCatalog(self.root_folder, index_meanings=not self.store.lazy_meanings)
+        self.store.on_load = self.catalog.folder_loaded
+        # Backends with their own text index answer searches without walking the tree
+        self.search_source = self.store if self.store.text_search else self.catalog
         self.init_ui()
 
     def init_ui(self):
@@ -370,7 +904,7 @@ class MainWindow(QMainWindow):
         self.sidebar.addWidget(self.export_btn)
 
         self.save_btn = QPushButton('Save Data')
-        self.save_btn.clicked.connect(self.save_data)
+        self.save_btn.clicked.connect(self.request_save)
         self.sidebar.addWidget(self.save_btn)
 
         self.flashcard_btn = QPushButton('Flashcards')
@@ -407,10 +941,30 @@ class MainWindow(QMainWindow):
         self.path_label.setFont(font)
         self.content_layout.addWidget(self.path_label)
 
-        # Scroll area for content
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.content_layout.addWidget(self.scroll_area)
+        # One folder view and one definition table, reused for every folder
+        self.folder_model = FolderListModel(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon), self)
+        self.folder_view = QListView()
+        self.folder_view.setViewMode(QListView.ViewMode.IconMode)
+        self.folder_view.setIconSize(QSize(64, 64))
+        self.folder_view.setGridSize(QSize(140, 110))
+        self.folder_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.folder_view.setMovement(QListView.Movement.Static)
+        self.folder_view.setWordWrap(True)
+        self.folder_view.setUniformItemSizes(True)
+        self.folder_view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.folder_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.folder_view.setModel(self.folder_model)
+        self.folder_view.clicked.connect(lambda index: self.enter_folder(self.folder_model.folder_at(index.row())))
+
+        self.definition_model = DefinitionTableModel(parent=self)
+        self.definition_table = definition_table_view(self.definition_model)
+
+        self.content_stack = QStackedWidget()
+        self.content_stack.addWidget(self.folder_view)
+        self.content_stack.addWidget(self.definition_table)
+        self.content_layout.addWidget(self.content_stack)
+        # Scroll position of every folder on the stack, restored when going back to it
+        self.scroll_stack = []
 
         # Toolbar
         toolbar = QToolBar("Toolbar")
@@ -424,10 +978,26 @@ class MainWindow(QMainWindow):
         delete_action.triggered.connect(self.delete_definition)
         toolbar.addAction(delete_action)
 
+        move_action = QAction("Move Definition", self)
+        move_action.triggered.connect(self.move_definition)
+        toolbar.addAction(move_action)
+
         search_action = QAction("Search Definitions", self)
         search_action.triggered.connect(self.search_definitions)
         toolbar.addAction(search_action)
 
+        search_all_action = QAction("Search All Folders", self)
+        search_all_action.triggered.connect(self.open_search_dialog)
+        toolbar.addAction(search_all_action)
+
+        all_definitions_action = QAction("All Definitions", self)
+        all_definitions_action.triggered.connect(self.open_all_definitions)
+        toolbar.addAction(all_definitions_action)
+
+        duplicates_action = QAction("Duplicate Report", self)
+        duplicates_action.triggered.connect(self.open_duplicate_report)
+        toolbar.addAction(duplicates_action)
+
         # Set layouts
         main_layout.addLayout(self.sidebar)
         main_layout.addLayout(self.content_layout)
@@ -439,69 +1009,64 @@ class MainWindow(QMainWindow):
 
         self.update_content()
 
+    def open_search_dialog(self):
+        search_dialog = SearchDialog(self, self.search_source)
+        search_dialog.exec()
+
+    def open_all_definitions(self):
+        all_definitions_dialog = AllDefinitionsDialog(self, self.search_source)
+        all_definitions_dialog.exec()
+
+    def open_duplicate_report(self):
+        duplicate_dialog = DuplicateReportDialog(self, self.search_source)
+        duplicate_dialog.exec()
+
     def open_flashcards(self):
-        if self.current_folder.definitions:
-            flashcard_dialog = FlashcardDialog(self.current_folder.definitions, self)
+        # Cards of the current folder and its subfolders in random order, with the reviews
+        # that are due first
+        if next(iter_definitions(self.current_folder), None) is not None:
+            reviews = self.review_store()
+            due = []
+            for definition_id, _ in reviews.due(time.time()):
+                definition = self.catalog.definitions_by_id.get(definition_id)
+                if definition is not None and self.catalog.in_folder(definition, self.current_folder):
+                    due.append(definition)
+            flashcard_dialog = FlashcardDialog(sample_tree(self.current_folder, counts=self.store.subtree_counts()), reviews, self, due)
             flashcard_dialog.exec()
         else:
             QMessageBox.information(self, 'Info', 'No definitions available for flashcards.')
 
+    def review_store(self):
+        # Flashcard review state, read when flashcards are first opened
+        if self.reviews is None:
+            self.reviews = ReviewStore(DATA_FILE + REVIEWS_SUFFIX).load()
+        return self.reviews
+
+    def open_result_flashcards(self, rows):
+        # Flashcards over (definition, path) rows of a search or filter, shuffled as they stream in
+        flashcard_dialog = FlashcardDialog(shuffle_stream(definition for definition, _ in rows),
+                                           self.review_store(), self)
+        flashcard_dialog.exec()
+
     def update_content(self):
         self.path_label.setText(' / '.join([folder.name for folder in self.folder_stack]))
 
-        widget = QWidget()
-        layout = QVBoxLayout(widget)
-        widget.setLayout(layout)
-
-        # Check if the current folder has definitions
+        # Folders with definitions show them in the table, the others show their subfolders
         if self.current_folder.definitions:
-            table = QTableWidget()
-            table.setColumnCount(2)
-            table.setHorizontalHeaderLabels(['Phrase', 'Meaning'])
-            table.horizontalHeader().setStretchLastSection(True)
-            table.setRowCount(len(self.current_folder.definitions))
-
-            for row, definition in enumerate(self.current_folder.definitions):
-                phrase_item = QTableWidgetItem(definition.phrase)
-                meaning_item = QTableWidgetItem(definition.meaning)
-                table.setItem(row, 0, phrase_item)
-                table.setItem(row, 1, meaning_item)
-
-            # Add table to layout
-            layout.addWidget(table)
+            self.folder_model.set_folders([])
+            self.definition_model.set_rows(self.current_folder.definitions)
+            self.content_stack.setCurrentWidget(self.definition_table)
         else:
-            # Display folders in grid if no definitions present
-            grid_layout = QGridLayout()
-            row, col = 0, 0
-
-            for folder in self.current_folder.subfolders:
-                button = QPushButton()
-                button.setFlat(True)
-                button.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-                button.setIconSize(QSize(64, 64))
-                label = QLabel(folder.name)
-                label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                label.setStyleSheet("margin-top: -5px;")
-                vbox = QVBoxLayout()
-                vbox.addWidget(button, alignment=Qt.AlignmentFlag.AlignCenter)
-                vbox.addWidget(label)
-                container = QWidget()
-                container.setLayout(vbox)
-                grid_layout.addWidget(container, row, col)
-                button.clicked.connect(lambda checked, f=folder: self.enter_folder(f))
-
-                col += 1
-                if col >= 3:
-                    col = 0
-                    row += 1
-
-            layout.addLayout(grid_layout)
-
-        # Update scroll area with new widget layout
-        self.scroll_area.setWidget(widget)
+            self.definition_model.set_rows([])
+            self.folder_model.set_folders(self.current_folder.subfolders)
+            self.content_stack.setCurrentWidget(self.folder_view)
         self.back_btn.setEnabled(len(self.folder_stack) > 1)
 
+    def current_view(self):
+        return self.content_stack.currentWidget()
+
     def enter_folder(self, folder):
+        self.scroll_stack.append(self.current_view().verticalScrollBar().value())
         self.folder_stack.append(folder)
         self.current_folder = folder
         self.update_content()
@@ -511,14 +1076,19 @@ class MainWindow(QMainWindow):
             self.folder_stack.pop()
             self.current_folder = self.folder_stack[-1]
             self.update_content()
+            if self.scroll_stack:
+                position = self.scroll_stack.pop()
+                # Batched layout may not have reached the old position yet
+                QTimer.singleShot(0, lambda: self.current_view().verticalScrollBar().setValue(position))
 
     def add_folder(self):
         name, ok = QInputDialog.getText(self, 'Add Folder', 'Folder Name:')
         if ok and name:
             new_folder = Folder(name)
             self.current_folder.subfolders.append(new_folder)
+            self.catalog.add_folder(new_folder, self.current_folder)
             self.update_content()
-            self.save_data()
+            self.record_change('add_folder', self.current_folder, id=new_folder.id, name=name, color=None)
 
     def add_definition(self):
         def_dialog = DefinitionDialog(self)
@@ -526,56 +1096,97 @@ class MainWindow(QMainWindow):
             phrase = def_dialog.phrase_input.text()
             meaning = def_dialog.meaning_input.toPlainText()
             if phrase and meaning:
-                new_def = Definition(phrase, meaning)
-                self.current_folder.definitions.append(new_def)
+                self.add_definitions(self.current_folder, [(phrase, meaning)])
                 self.update_content()
-                self.save_data()
+
+    def choose_definition(self, title):
+        # Repeated phrases get a " (2)", " (3)", ... suffix to tell them apart in the list; the
+        # choice maps back by position, so a phrase that really ends in " (2)" is no problem
+        definitions = self.current_folder.definitions
+        labels, seen = [], {}
+        for definition in definitions:
+            count = seen[definition.phrase] = seen.get(definition.phrase, 0) + 1
+            labels.append(definition.phrase if count == 1 else f'{definition.phrase} ({count})')
+        current = 0
+        if self.definition_table is not None and self.definition_table.currentIndex().isValid():
+            current = self.definition_table.currentIndex().row()
+        index = ChoiceDialog.choose(self, title, 'Select a definition:', labels, current)
+        return None if index is None else definitions[index].id
 
     def edit_definition(self):
         if not self.current_folder.definitions:
             QMessageBox.warning(self, 'Error', 'No definitions to edit.')
             return
 
-        definition_to_edit, ok = QInputDialog.getItem(self, 'Edit Definition', 'Select a definition:',
-                                                      [d.phrase for d in self.current_folder.definitions],
-                                                      editable=False)
-        if ok and definition_to_edit:
-            definition = next(d for d in self.current_folder.definitions if d.phrase == definition_to_edit)
+        definition_id = self.choose_definition('Edit Definition')
+        if definition_id is not None:
+            definition = self.catalog.definition(definition_id)
             dialog = DefinitionDialog(self, definition)
             if dialog.exec():
                 definition.phrase = dialog.phrase_input.text()
                 definition.meaning = dialog.meaning_input.toPlainText()
+                self.catalog.update_definition(definition)
                 self.update_content()
-                self.save_data()
+                self.record_change('edit_definition', self.current_folder, definition=definition.id,
+                                   phrase=definition.phrase, meaning=definition.meaning)
 
     def delete_definition(self):
         if not self.current_folder.definitions:
             QMessageBox.warning(self, 'Error', 'No definitions to delete.')
             return
 
-        definition_to_delete, ok = QInputDialog.getItem(self, 'Delete Definition', 'Select a definition:',
-                                                        [d.phrase for d in self.current_folder.definitions],
-                                                        editable=False)
-        if ok and definition_to_delete:
-            self.current_folder.definitions = [d for d in self.current_folder.definitions if
-                                               d.phrase != definition_to_delete]
+        definition_id = self.choose_definition('Delete Definition')
+        if definition_id is not None:
+            definition = self.catalog.definition(definition_id)
+            self.catalog.remove_definitions([definition])
+            self.current_folder.definitions.remove(definition)
             self.update_content()
-            self.save_data()
+            self.record_change('delete_definitions', self.current_folder, definitions=[definition_id])
+
+    def move_definition(self):
+        if not self.current_folder.definitions:
+            QMessageBox.warning(self, 'Error', 'No definitions to move.')
+            return
+
+        definition_id = self.choose_definition('Move Definition')
+        if definition_id is None:
+            return
+        folders = [folder for folder in self.catalog.folder_paths if folder is not self.current_folder]
+        if not folders:
+            QMessageBox.warning(self, 'Error', 'No other folder to move to.')
+            return
+        index = ChoiceDialog.choose(self, 'Move Definition', 'Move to folder:',
+                                    [self.catalog.path_of(folder) for folder in folders])
+        if index is not None:
+            target = folders[index]
+            definition = self.catalog.definition(definition_id)
+            self.current_folder.definitions.remove(definition)
+            target.definitions.append(definition)
+            self.catalog.move_definitions([definition], target)
+            self.update_content()
+            self.record_change('move_definitions', target, source=self.current_folder.id,
+                               definitions=[definition_id])
 
     def search_definitions(self):
         search_term, ok = QInputDialog.getText(self, 'Search Definitions', 'Enter a phrase or meaning:')
         if ok and search_term:
             matches = [d for d in self.current_folder.definitions if
                        search_term.lower() in d.phrase.lower() or search_term.lower() in d.meaning.lower()]
+            if not matches:
+                # Fall back to the closest phrases in this folder, compared one by one rather
+                # than through the library-wide fuzzy index, which is built off the GUI thread
+                similar = closest_definitions(self.current_folder.definitions, search_term)
+                if similar and QMessageBox.question(
+                        self, 'Search Definitions',
+                        f'No matches found. Did you mean "{similar[0].phrase}"?') == QMessageBox.StandardButton.Yes:
+                    matches = similar
+                elif similar:
+                    return
             if matches:
                 result_dialog = QDialog(self)
                 result_dialog.setWindowTitle('Search Results')
                 layout = QVBoxLayout(result_dialog)
-                table = QTableWidget(len(matches), 2)
-                table.setHorizontalHeaderLabels(['Phrase', 'Meaning'])
-                for i, definition in enumerate(matches):
-                    table.setItem(i, 0, QTableWidgetItem(definition.phrase))
-                    table.setItem(i, 1, QTableWidgetItem(definition.meaning))
+                table = definition_table_view(DefinitionTableModel(matches, parent=result_dialog))
                 layout.addWidget(table)
                 result_dialog.setLayout(layout)
                 result_dialog.exec()
@@ -587,7 +1198,7 @@ class MainWindow(QMainWindow):
         if color.isValid():
             self.current_folder.color = color.name()
             self.update_content()
-            self.save_data()
+            self.record_change('set_color', self.current_folder, color=self.current_folder.color)
 
     def import_data(self):
         options = QFileDialog.Option.ReadOnly
@@ -602,48 +1213,90 @@ class MainWindow(QMainWindow):
 
     def import_tabular_data(self, file_name, file_type):
         try:
-            if file_type == 'csv':
-                df = pd.read_csv(file_name)
-            elif file_type == 'xlsx':
-                df = pd.read_excel(file_name)
-
-            preview_dialog = DataPreviewDialog(df, self)
-            if preview_dialog.exec() == QDialog.DialogCode.Accepted:
-                selected_data = preview_dialog.get_selected_data()
-                for phrase, meaning in selected_data:
-                    new_def = Definition(phrase, meaning)
-                    self.current_folder.definitions.append(new_def)
-                self.update_content()
-                self.save_data()
+            TabularImport(self, file_name, file_type).run()
         except Exception as e:
             QMessageBox.warning(self, 'Error', f'Failed to import data: {e}')
 
+    def add_definitions(self, folder, rows, policy='keep_both'):
+        # Returns how many rows were added, overwrote an existing meaning, or were skipped
+        rows, updates, skipped = self.catalog.plan_merge(folder, rows, policy)
+        for definition, meaning in updates:
+            definition.meaning = meaning
+            self.catalog.update_definition(definition)
+        if updates:
+            self.record_change('edit_definitions', folder,
+                               definitions=[[d.id, d.phrase, d.meaning] for d, _ in updates])
+        if rows:
+            new_defs = folder.add_definitions(rows)
+            self.catalog.add_definitions(folder, new_defs)
+            self.record_change('add_definitions', folder,
+                               definitions=[[d.phrase, d.meaning, d.id] for d in new_defs])
+        return len(rows), len(updates), skipped
+
     def export_data(self):
-        file_name, _ = QFileDialog.getSaveFileName(
-            self, 'Export Data', '', 'JSON Files (*.json)')
-        if file_name:
-            try:
-                with open(file_name, 'w') as f:
-                    json.dump(self.root_folder.to_dict(), f, indent=4)
-            except Exception as e:
-                QMessageBox.warning(self, 'Error', f'Failed to export data: {e}')
+        # Exports the current folder and its subfolders, streaming rows straight to the file
+        file_name, selected_filter = QFileDialog.getSaveFileName(
+            self, 'Export Data', '', ';;'.join(EXPORT_FORMATS.values()))
+        if not file_name:
+            return
+        file_format = file_name.rsplit('.', 1)[-1].lower()
+        if file_format not in EXPORT_FORMATS:
+            file_format = next(key for key, label in EXPORT_FORMATS.items() if label == selected_filter)
+            file_name += '.' + file_format
+        query = None
+        if file_format != 'json':
+            query, ok = QInputDialog.getText(self, 'Export Data',
+                                             'Only definitions containing (leave empty for all):')
+            if not ok:
+                return
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            count = export_folder(file_name, self.current_folder, self.catalog.path_of(self.current_folder),
+                                  file_format, query)
+        except Exception as e:
+            QMessageBox.warning(self, 'Error', f'Failed to export data: {e}')
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.statusBar().showMessage(f'Exported {count:,} definitions to {file_name}')
+
+    def record_change(self, op, folder, **fields):
+        # Append one journal record for the edit instead of rewriting the whole tree
+        try:
+            self.store.record(op, folder.id, **fields)
+            if self.store.needs_compaction():
+                self.request_save()
+        except Exception as e:
+            QMessageBox.warning(self, 'Error', f'Failed to save data: {e}')
+
+    def request_save(self):
+        self.show_save_status('dirty')
+        self.save_timer.start()
 
     def save_data(self):
+        # Snapshot on the GUI thread; the writer thread serializes it to disk atomically
         try:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(self.root_folder.to_dict(), f, indent=4)
+            self.store.compact(self.root_folder, background=True)
         except Exception as e:
             QMessageBox.warning(self, 'Error', f'Failed to save data: {e}')
 
+    def show_save_status(self, status):
+        self.statusBar().showMessage(SAVE_STATUS_TEXT[status])
+
+    def closeEvent(self, event):
+        if self.save_timer.isActive():
+            self.save_timer.stop()
+            self.save_data()
+        self.store.close()
+        if self.reviews is not None:
+            self.reviews.close()
+        super().closeEvent(event)
+
     def load_data(self):
         try:
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
-                self.root_folder = Folder.from_dict(data)
-                self.current_folder = self.root_folder
-                self.folder_stack = [self.root_folder]
-        except FileNotFoundError:
-            pass
+            self.root_folder = self.store.load()
+            self.current_folder = self.root_folder
+            self.folder_stack = [self.root_folder]
         except Exception as e:
             print(f"Failed to load data: {e}")
 
@@ -651,8 +1304,20 @@ class MainWindow(QMainWindow):
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
-    window = MainWindow()
+
+    splash = QSplashScreen()
+    splash.show()
+
+    def show_progress(progress):
+        percent = 100 * progress.bytes_read // max(progress.total_bytes, 1)
+        splash.showMessage(f'Loading library... {percent}% '
+                           f'({progress.folders} folders, {progress.definitions} definitions)',
+                           Qt.AlignmentFlag.AlignBottom | Qt.AlignmentFlag.AlignHCenter)
+        app.processEvents()
+
+    window = MainWindow(on_progress=show_progress)
     window.show()
+    splash.finish(window)
     sys.exit(app.exec())
 
 
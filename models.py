@@ -0,0 +1,184 @@
+import sys
+import threading
+
+
+def intern(value):
+    # Folder names and colors repeat across the tree; share one string object per value
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+# Hands out the integer IDs shared by folders and definitions. IDs read back from storage
+# are claimed as-is and push the counter past them, so new objects never reuse one.
+class IdAllocator:
+    def __init__(self):
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def claim(self, value=None):
+        with self.lock:
+            if value is None:
+                value = self.next_id
+            if value >= self.next_id:
+                self.next_id = value + 1
+            return value
+
+
+ids = IdAllocator()
+
+
+# Data Models
+# Both classes use __slots__: at millions of definitions a per-instance __dict__
+# costs more memory than the text itself.
+class Definition:
+    __slots__ = ('id', 'phrase', 'meaning')
+
+    def __init__(self, phrase, meaning, id=None):
+        self.id = ids.claim(id)
+        self.phrase = phrase
+        self.meaning = meaning
+
+    def to_dict(self):
+        return {'id': self.id, 'phrase': self.phrase, 'meaning': self.meaning}
+
+    @staticmethod
+    def from_dict(data):
+        return Definition(data['phrase'], data['meaning'], data.get('id'))
+
+
+def restore_definitions(rows):
+    # Definitions read back from storage as (id, phrase, meaning) rows. They skip the locked
+    # allocator call per object, which costs as much as the rest of the construction;
+    # the largest ID is claimed once at the end instead.
+    new = Definition.__new__
+    definitions = []
+    append = definitions.append
+    top = 0
+    for definition_id, phrase, meaning in rows:
+        definition = new(Definition)
+        definition.id = definition_id
+        definition.phrase = phrase
+        definition.meaning = meaning
+        append(definition)
+        if definition_id > top:
+            top = definition_id
+    if top:
+        ids.claim(top)
+    return definitions
+
+
+resident_meaning = Definition.meaning  # The slot itself, before MappedDefinition shadows it
+
+
+# A definition whose meaning stays in a MeaningBlob file, addressed by location, until it is
+# read; reads go through the blob's LRU cache. Assigning a meaning makes it resident again.
+class MappedDefinition(Definition):
+    __slots__ = ('blob', 'location')
+
+    @property
+    def meaning(self):
+        if self.location is None:
+            return resident_meaning.__get__(self)
+        return self.blob.get(self.location)
+
+    @meaning.setter
+    def meaning(self, meaning):
+        self.location = None
+        resident_meaning.__set__(self, meaning)
+
+
+def restore_mapped_definitions(rows, blob):
+    # Like restore_definitions, for (id, phrase, location) rows whose meanings are in blob
+    new = MappedDefinition.__new__
+    definitions = []
+    append = definitions.append
+    top = 0
+    for definition_id, phrase, location in rows:
+        definition = new(MappedDefinition)
+        definition.id = definition_id
+        definition.phrase = phrase
+        definition.blob = blob
+        definition.location = location
+        append(definition)
+        if definition_id > top:
+            top = definition_id
+    if top:
+        ids.claim(top)
+    return definitions
+
+
+class Folder:
+    __slots__ = ('id', 'name', 'color', '_subfolders', '_definitions', 'loader')
+
+    def __init__(self, name, color=None, loader=None, id=None):
+        self.id = ids.claim(id)
+        self.name = intern(name)
+        self.color = intern(color)  # Store color as a hex string
+        self._subfolders = []
+        self._definitions = []
+        # Called once with the folder to fill in its subfolders and definitions on first access
+        self.loader = loader
+
+    @property
+    def loaded(self):
+        return self.loader is None
+
+    def load(self):
+        if self.loader is not None:
+            loader, self.loader = self.loader, None
+            loader(self)
+
+    @property
+    def subfolders(self):
+        self.load()
+        return self._subfolders
+
+    @subfolders.setter
+    def subfolders(self, subfolders):
+        self._subfolders = subfolders
+
+    @property
+    def definitions(self):
+        self.load()
+        return self._definitions
+
+    @definitions.setter
+    def definitions(self, definitions):
+        self._definitions = definitions
+
+    def add_definitions(self, rows):
+        # Bulk insert of (phrase, meaning) or (phrase, meaning, id) rows; returns the new definitions
+        new_definitions = list(map(Definition, *zip(*rows))) if rows else []
+        self.definitions.extend(new_definitions)
+        return new_definitions
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'color': self.color,
+            'subfolders': [folder.to_dict() for folder in self.subfolders],
+            'definitions': [definition.to_dict() for definition in self.definitions]
+        }
+
+    @staticmethod
+    def from_dict(data):
+        folder = Folder(data['name'], data.get('color'), id=data.get('id'))
+        folder.subfolders = [Folder.from_dict(sf) for sf in data.get('subfolders', [])]
+        folder.definitions = [Definition.from_dict(d) for d in data.get('definitions', [])]
+        return folder
+
+
+def iter_folders(folder, path='Root'):
+    # Depth-first (folder, "Root/..." path) pairs for a folder and everything below it
+    stack = [(folder, path)]
+    while stack:
+        folder, path = stack.pop()
+        yield folder, path
+        stack.extend((subfolder, f'{path}/{subfolder.name}') for subfolder in reversed(folder.subfolders))
+
+
+def iter_definitions(folder, path='Root'):
+    # (definition, folder path) for every definition in a folder and its subfolders
+    for subfolder, subfolder_path in iter_folders(folder, path):
+        for definition in subfolder.definitions:
+            yield definition, subfolder_path
@@ -0,0 +1,216 @@
+# Spaced repetition for the flashcards: SM-2 scheduling, review state kept in its own
+# append-only file next to the library, lazily shuffled card sources and a heap of the cards
+# seen so far keyed by due time.
+import heapq
+import itertools
+import json
+import os
+import random
+from bisect import bisect_right
+
+from storage import write_atomic
+
+REVIEWS_SUFFIX = '.reviews'
+GRADES = {'again': 1, 'hard': 3, 'good': 4, 'easy': 5}  # SM-2 answer quality of each button
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+DAY = 24 * 60 * 60
+RELEARN_SECONDS = 10 * 60  # A forgotten card comes back within the same session
+REVIEWS_COMPACT_MIN_RECORDS = 1000  # Rewrite the log once it has this many records and
+REVIEWS_COMPACT_RATIO = 2  # this many per reviewed card
+SHUFFLE_BUFFER_SIZE = 1024  # Items a stream of unknown length is shuffled across
+
+
+class Review:
+    __slots__ = ('due', 'interval', 'ease', 'repetitions', 'lapses')
+
+    def __init__(self, due=0, interval=0, ease=INITIAL_EASE, repetitions=0, lapses=0):
+        self.due = due  # Unix time
+        self.interval = interval  # Seconds
+        self.ease = ease
+        self.repetitions = repetitions
+        self.lapses = lapses
+
+    def to_list(self, definition_id):
+        return [definition_id, self.due, self.interval, round(self.ease, 3), self.repetitions, self.lapses]
+
+
+def schedule(review, grade, now):
+    # SM-2: the state after answering with quality grade (0-5). A grade below 3 starts the
+    # card over and brings it back after RELEARN_SECONDS.
+    ease = max(MIN_EASE, review.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    if grade < 3:
+        return Review(int(now) + RELEARN_SECONDS, 0, ease, 0, review.lapses + 1)
+    if review.repetitions == 0:
+        interval = DAY
+    elif review.repetitions == 1:
+        interval = 6 * DAY
+    else:
+        interval = round(max(review.interval, DAY) * ease)
+    return Review(int(now) + interval, interval, ease, review.repetitions + 1, review.lapses)
+
+
+# Review state by definition ID. Every answer appends one JSON line; the last line for an ID
+# wins, and the file is rewritten with one line per card once it is mostly superseded lines.
+class ReviewStore:
+    def __init__(self, path):
+        self.path = path
+        self.reviews = {}
+        self.records = 0
+        self.log = None
+
+    def load(self):
+        self.reviews, self.records = {}, 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        definition_id, *fields = json.loads(line)
+                    except (json.JSONDecodeError, ValueError):
+                        # A torn final record from a crash mid-append
+                        break
+                    self.reviews[definition_id] = Review(*fields)
+                    self.records += 1
+        except FileNotFoundError:
+            pass
+        return self
+
+    def get(self, definition_id):
+        return self.reviews.get(definition_id)
+
+    def due(self, now):
+        # (definition ID, review) of every card due by now
+        return ((definition_id, review) for definition_id, review in self.reviews.items() if review.due <= now)
+
+    def record(self, definition_id, review):
+        self.reviews[definition_id] = review
+        if self.log is None:
+            self.log = open(self.path, 'a', encoding='utf-8')
+        self.log.write(json.dumps(review.to_list(definition_id)) + '\n')
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        self.records += 1
+        if self.records > max(REVIEWS_COMPACT_MIN_RECORDS, REVIEWS_COMPACT_RATIO * len(self.reviews)):
+            self.compact()
+
+    def compact(self):
+        self.close()
+        write_atomic(self.path, lambda f: f.writelines(
+            json.dumps(review.to_list(definition_id)) + '\n' for definition_id, review in self.reviews.items()))
+        self.records = len(self.reviews)
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+def sample_tree(folder, rng=random, counts=None):
+    # Every definition of the folder and its subfolders once, in uniformly random order, by an
+    # incremental Fisher-Yates shuffle over their positions in the tree. Only subtree sizes and
+    # the positions displaced so far are kept, never a list of the definitions. Folders not
+    # loaded yet are sized from counts (folder ID -> definitions at and below it, as given by
+    # the store's subtree_counts) and only loaded once a card in them is drawn.
+    sizes, layouts = {}, {}
+
+    def size(subfolder):
+        if subfolder not in sizes:
+            if not subfolder.loaded and counts is not None and subfolder.id in counts:
+                sizes[subfolder] = counts[subfolder.id]
+            else:
+                own, ends = layout(subfolder)
+                sizes[subfolder] = ends[-1] if ends else own
+        return sizes[subfolder]
+
+    def layout(subfolder):
+        # (own definitions, ends) where ends[i] is the position after the i-th subfolder's
+        # definitions, counting the folder's own first
+        if subfolder not in layouts:
+            own = end = len(subfolder.definitions)
+            ends = []
+            for child in subfolder.subfolders:
+                end += size(child)
+                ends.append(end)
+            layouts[subfolder] = own, ends
+        return layouts[subfolder]
+
+    def locate(subfolder, position):
+        while True:
+            own, ends = layout(subfolder)
+            if position < own:
+                return subfolder.definitions[position]
+            index = bisect_right(ends, position)
+            if index == len(ends):
+                return None  # Deleted since the sizes were taken
+            position -= ends[index - 1] if index else own
+            subfolder = subfolder.subfolders[index]
+
+    total = size(folder)
+    swaps = {}
+    for i in range(total):
+        j = rng.randrange(i, total)
+        position = swaps.get(j, j)
+        swaps[j] = swaps.pop(i, i)
+        definition = locate(folder, position)
+        if definition is not None:
+            yield definition
+
+
+def shuffle_stream(items, buffer_size=SHUFFLE_BUFFER_SIZE, rng=random):
+    # Random order for a stream of unknown length, e.g. search results, with a bounded buffer:
+    # each item out is drawn at random from the next buffer_size items in
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+# The cards of one session, drawn lazily from an iterator in the order it gives them. Cards
+# seen so far sit in a heap of (due, draw order, definition ID), so memory grows with the
+# cards seen rather than with the source. A card never reviewed is due when it is drawn;
+# cards passed as due are queued up front, so reviews that are due come before new cards.
+class ReviewQueue:
+    def __init__(self, cards, store, due=()):
+        self.cards = iter(cards)
+        self.store = store
+        self.definitions = {}
+        self.heap = []
+        self.order = itertools.count()
+        for definition in due:
+            self.push(definition, store.get(definition.id).due)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, definition, due):
+        self.definitions[definition.id] = definition
+        heapq.heappush(self.heap, (due, next(self.order), definition.id))
+
+    def peek(self, now):
+        # (due, definition) of the card due first, drawing cards until one is due by now;
+        # None when the session has no cards
+        while not self.heap or self.heap[0][0] > now:
+            definition = next(self.cards, None)
+            if definition is None:
+                break
+            if definition.id not in self.definitions:
+                review = self.store.get(definition.id)
+                self.push(definition, now if review is None else review.due)
+        if not self.heap:
+            return None
+        due, _, definition_id = self.heap[0]
+        return due, self.definitions[definition_id]
+
+    def answer(self, grade, now):
+        # Grades the card at the top of the heap and puts it back at its new due time
+        _, _, definition_id = self.heap[0]
+        review = schedule(self.store.get(definition_id) or Review(), grade, now)
+        self.store.record(definition_id, review)
+        heapq.heapreplace(self.heap, (review.due, next(self.order), definition_id))
+        return review
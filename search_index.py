@@ -0,0 +1,741 @@
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from operator import itemgetter
+
+
+NGRAM_SIZE = 3
+MERGE_POLICIES = ('skip', 'overwrite', 'keep_both')
+# Typos tolerated by fuzzy lookups, by query length: none up to 2 characters, one up to 5, then two
+FUZZY_DISTANCES = ((2, 0), (5, 1))
+FUZZY_MAX_DISTANCE = 2
+FUZZY_MIN_WORD = 3  # Shorter words of a phrase are not matched on their own
+# Ranked search: BM25 per field, summed with these weights (phrase, meaning, folder path)
+RANK_FIELD_WEIGHTS = (3.0, 1.0, 0.5)
+BM25_K1 = 1.2
+BM25_B = 0.75
+RANKED_RESULT_LIMIT = 200  # Results kept by a ranked search
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def normalize_phrase(phrase):
+    # Case- and whitespace-folded form under which two phrases count as duplicates
+    return ' '.join(phrase.split()).casefold()
+
+
+def terms(text):
+    return re.findall(r'\w+', text.casefold())
+
+
+def fuzzy_keys(key):
+    # Forms of a normalized phrase that fuzzy lookups match: the phrase itself, the phrase
+    # without parenthesized annotations such as "(s)" or "(u,v)", and each of its words
+    stripped = ' '.join(re.sub(r'\([^)]*\)', ' ', key).split())
+    forms = {key}
+    if stripped:
+        forms.add(stripped)
+    forms.update(word for word in terms(stripped or key) if len(word) >= FUZZY_MIN_WORD)
+    return forms
+
+
+def fuzzy_distance(key):
+    for length, distance in FUZZY_DISTANCES:
+        if len(key) <= length:
+            return distance
+    return FUZZY_MAX_DISTANCE
+
+
+def char_masks(text):
+    # Bit i of masks[c] is set when text[i] == c
+    masks = {}
+    for i, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | 1 << i
+    return masks
+
+
+def masked_distance(masks, length, text):
+    # Levenshtein distance between the text the masks were built from (of the given length) and
+    # text, with the bit-parallel algorithm of Myers/Hyyrö: one column of the table per character
+    if not length:
+        return len(text)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    vp, vn, score = full, 0, length
+    for char in text:
+        eq = masks.get(char, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        hp = (hp << 1) | 1
+        hn <<= 1
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+    return score
+
+
+def edit_distance(a, b):
+    return masked_distance(char_masks(a), len(a), b)
+
+
+def duplicate_groups(rows):
+    # Groups (definition, path) rows by normalized phrase in one pass, keeping groups of two
+    # or more in the order their first member was seen
+    groups = {}
+    for row in rows:
+        key = normalize_phrase(row[0].phrase)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = row
+        elif isinstance(group, list):
+            group.append(row)
+        else:
+            groups[key] = [group, row]
+    return [group for group in groups.values() if isinstance(group, list)]
+
+
+# Normalized phrase -> the definitions with that phrase. A key with a single definition
+# maps to it directly; only actual duplicates pay for a list.
+class PhraseIndex:
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, key, definition):
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = definition
+        elif isinstance(group, list):
+            group.append(definition)
+        else:
+            self.groups[key] = [group, definition]
+
+    def remove(self, key, definition):
+        # Compared with ==, so the entries can also be definition IDs
+        group = self.groups.get(key)
+        if isinstance(group, list):
+            if definition in group:
+                group.remove(definition)
+                if len(group) == 1:
+                    self.groups[key] = group[0]
+        elif group is not None and group == definition:
+            del self.groups[key]
+
+    def items(self, key):
+        group = self.groups.get(key)
+        if group is None:
+            return ()
+        return group if isinstance(group, list) else (group,)
+
+    def first(self, key):
+        group = self.groups.get(key)
+        return group[0] if isinstance(group, list) else group
+
+
+# BK-tree over the fuzzy_keys forms of normalized phrases: every child hangs off its parent by
+# their edit distance, so a lookup within distance k only descends into children whose edge is
+# within k of the distance to the parent, and skips the rest of the tree. Removed keys stay in
+# the tree as dead nodes until they outnumber the live ones, then the tree is rebuilt from the
+# live keys.
+class BKTree:
+    def __init__(self, keys=()):
+        self.root = None  # [key, live, {distance: child}]
+        self.live = 0
+        self.dead = 0
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return self.live
+
+    def _node(self, key):
+        masks, length = char_masks(key), len(key)
+        node = self.root
+        while node is not None:
+            distance = masked_distance(masks, length, node[0])
+            if distance == 0:
+                return node
+            node = node[2].get(distance)
+        return None
+
+    def add(self, key):
+        if self.root is None:
+            self.root = [key, True, {}]
+            self.live += 1
+            return
+        masks, length = char_masks(key), len(key)
+        node = self.root
+        while True:
+            distance = masked_distance(masks, length, node[0])
+            if distance == 0:
+                if not node[1]:
+                    node[1] = True
+                    self.live += 1
+                    self.dead -= 1
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, True, {}]
+                self.live += 1
+                return
+            node = child
+
+    def remove(self, key):
+        node = self._node(key)
+        if node is None or not node[1]:
+            return
+        node[1] = False
+        self.live -= 1
+        self.dead += 1
+        if self.dead > self.live:
+            self.rebuild()
+
+    def rebuild(self):
+        keys = list(self)
+        self.root, self.live, self.dead = None, 0, 0
+        for key in keys:
+            self.add(key)
+
+    def __iter__(self):
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if node[1]:
+                yield node[0]
+            stack.extend(node[2].values())
+
+    def find(self, key, max_distance):
+        # (distance, key) for every live key within max_distance, closest first. Children are
+        # looked up by distance rather than iterated, so concurrent adds cannot break a lookup.
+        found = []
+        masks, length = char_masks(key), len(key)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = masked_distance(masks, length, node[0])
+            if distance <= max_distance and node[1]:
+                found.append((distance, node[0]))
+            children = node[2]
+            for edge in range(max(distance - max_distance, 1), distance + max_distance + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+# Fuzzy lookup of normalized phrases by any of their fuzzy_keys: a BKTree over the forms and,
+# for each form, the set of phrases it came from. Adding a phrase twice or removing one that is
+# not there changes nothing. Not synchronized; callers hold one lock over updates and lookups.
+class FuzzyIndex:
+    def __init__(self, keys=()):
+        self.tree = BKTree()
+        self.phrases = {}  # form -> set of normalized phrases
+        for key in keys:
+            self.add(key)
+
+    def add(self, key):
+        for form in fuzzy_keys(key):
+            phrases = self.phrases.get(form)
+            if phrases is None:
+                self.phrases[form] = {key}
+                self.tree.add(form)
+            else:
+                phrases.add(key)
+
+    def remove(self, key):
+        for form in fuzzy_keys(key):
+            phrases = self.phrases.get(form)
+            if phrases is not None:
+                phrases.discard(key)
+                if not phrases:
+                    del self.phrases[form]
+                    self.tree.remove(form)
+
+    def find(self, key, max_distance):
+        # (distance, phrase) for every phrase with a form within max_distance, closest first
+        best = {}
+        for distance, form in self.tree.find(key, max_distance):
+            for phrase in self.phrases[form]:
+                best.setdefault(phrase, distance)
+        return [(distance, phrase) for phrase, distance in best.items()]
+
+
+def closest_definitions(definitions, query, max_distance=None):
+    # Definitions whose normalized phrase, or one of its fuzzy_keys forms, is within
+    # max_distance edits of the query (by default fuzzy_distance of it), closest first. Every
+    # phrase is compared in turn: for one lookup over a folder or a one-off command, which
+    # would not pay for building a FuzzyIndex.
+    key = normalize_phrase(query)
+    if max_distance is None:
+        max_distance = fuzzy_distance(key)
+    masks, length = char_masks(key), len(key)
+    found = []
+    for definition in definitions:
+        distance = min(masked_distance(masks, length, form) for form in fuzzy_keys(normalize_phrase(definition.phrase)))
+        if distance <= max_distance:
+            found.append((distance, definition))
+    found.sort(key=itemgetter(0))
+    return [definition for _, definition in found]
+
+
+def merge_rows(phrases, rows, policy):
+    # Splits imported (phrase, meaning) rows into rows to add, (definition, meaning) overwrites
+    # and a count of skipped rows, with one hash lookup per row against the PhraseIndex of
+    # the target folder. Duplicates within the rows are merged the same way.
+    if policy == 'keep_both':
+        return list(rows), [], 0
+    added, pending, updates, skipped = [], {}, {}, 0
+    for phrase, meaning in rows:
+        key = normalize_phrase(phrase)
+        definition = phrases.first(key)
+        if definition is None and key not in pending:
+            pending[key] = len(added)
+            added.append((phrase, meaning))
+        elif policy == 'skip':
+            skipped += 1
+        elif definition is not None:
+            updates[definition] = meaning
+        else:
+            added[pending[key]] = (added[pending[key]][0], meaning)
+    return added, list(updates.items()), skipped
+
+
+# Inverted n-gram index over the lowercased phrase and meaning of each definition.
+# Substring queries only verify the definitions that share every n-gram of the query.
+# Definitions are numbered in the order they are added, and each posting is an array of those
+# ordinals: four bytes per n-gram of a definition instead of a set slot. Removing or editing a
+# definition leaves its old ordinals in the postings, where lookups skip or verify them away;
+# once they are as many as the live definitions the postings are rebuilt.
+class TrigramIndex:
+    def __init__(self):
+        self.postings = {}  # n-gram -> array of ordinals
+        self.ordinals = {}  # definition -> ordinal
+        self.definitions = []  # ordinal -> definition, None once removed
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def add_many(self, definitions, batch_size=4096):
+        # Groups each batch by n-gram first, so every posting is extended once per batch. A
+        # definition already in the index is re-indexed under its ordinal, keeping its place.
+        definitions = list(definitions)
+        for start in range(0, len(definitions), batch_size):
+            grouped = {}
+            for definition in definitions[start:start + batch_size]:
+                ordinal = self.ordinals.get(definition)
+                if ordinal is None:
+                    ordinal = self.ordinals[definition] = len(self.definitions)
+                    self.definitions.append(definition)
+                else:
+                    self.stale += 1
+                for gram in text_grams(definition):
+                    grouped.setdefault(gram, []).append(ordinal)
+            for gram, ordinals in grouped.items():
+                posting = self.postings.get(gram)
+                if posting is None:
+                    self.postings[gram] = array('I', ordinals)
+                else:
+                    posting.extend(ordinals)
+        self._compact()
+
+    def remove(self, definition):
+        ordinal = self.ordinals.pop(definition, None)
+        if ordinal is not None:
+            self.definitions[ordinal] = None
+            self.stale += 1
+            self._compact()
+
+    def update(self, definition):
+        # Re-index after an edit, keeping the definition's position in the results
+        if definition in self.ordinals:
+            self.add_many((definition,))
+
+    def _compact(self):
+        if self.stale > max(len(self.ordinals), 1024):
+            definitions = [definition for definition in self.definitions if definition is not None]
+            self.postings, self.ordinals, self.definitions, self.stale = {}, {}, [], 0
+            self.add_many(definitions)
+
+    def candidates(self, query):
+        # Definitions sharing every n-gram of a lowercased query, in the order they were added
+        postings = []
+        for gram in ngrams(query):
+            posting = self.postings.get(gram)
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                return []
+        definitions = self.definitions
+        return [definitions[ordinal] for ordinal in sorted(result) if definitions[ordinal] is not None]
+
+
+def text_grams(definition):
+    return ngrams(definition.phrase.lower()) | ngrams(definition.meaning.lower())
+
+
+def text_matches(definition, query):
+    # True when the definition's phrase or meaning contains the lowercased query
+    return query in definition.phrase.lower() or query in definition.meaning.lower()
+
+
+# Term frequencies and lengths of one field, per document (a definition, or a folder for paths)
+class FieldPostings:
+    def __init__(self):
+        self.postings = {}  # term -> {document: term frequency}
+        self.lengths = {}  # document -> number of terms
+        self.total_length = 0
+
+    def add(self, document, text):
+        counts = Counter(terms(text))
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[document] = count
+        length = self.lengths[document] = sum(counts.values())
+        self.total_length += length
+        return tuple(counts)
+
+    def remove(self, document, document_terms):
+        for term in document_terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(document, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(document, 0)
+
+    def scores(self, term, weight):
+        # (document, weighted BM25 term-frequency part) for every document containing term
+        posting = self.postings.get(term)
+        if not posting:
+            return
+        average = self.total_length / len(self.lengths)
+        lengths = self.lengths
+        for document, count in posting.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[document] / average)
+            yield document, weight * count * (BM25_K1 + 1) / (count + norm)
+
+
+# BM25 over the words of each definition's phrase and meaning and of its folder's path. Scores
+# are summed per field with RANK_FIELD_WEIGHTS, so a word in the phrase counts most. Term
+# statistics are kept as definitions change; a query only walks the postings of its own terms
+# and keeps the best results with a bounded heap. Without index_meanings the meaning field is
+# left out, so building the index does not read every meaning.
+class RankedIndex:
+    def __init__(self, index_meanings=True):
+        self.index_meanings = index_meanings
+        self.phrases = FieldPostings()
+        self.meanings = FieldPostings()
+        self.paths = FieldPostings()
+        self.document_terms = {}  # definition -> (phrase terms, meaning terms)
+
+    def __len__(self):
+        return len(self.document_terms)
+
+    def add_folder(self, folder, path):
+        if folder not in self.paths.lengths:
+            self.paths.add(folder, path)
+
+    def add(self, definition):
+        if definition in self.document_terms:
+            self.remove(definition)
+        meaning_terms = self.meanings.add(definition, definition.meaning) if self.index_meanings else ()
+        self.document_terms[definition] = (self.phrases.add(definition, definition.phrase), meaning_terms)
+
+    def remove(self, definition):
+        document_terms = self.document_terms.pop(definition, None)
+        if document_terms is not None:
+            self.phrases.remove(definition, document_terms[0])
+            self.meanings.remove(definition, document_terms[1])
+
+    def top(self, query, limit=RANKED_RESULT_LIMIT):
+        # (score, definition) for the best matches, best first
+        total = len(self.document_terms)
+        if not total:
+            return []
+        phrase_weight, meaning_weight, path_weight = RANK_FIELD_WEIGHTS
+        scores = {}
+        for term in set(terms(query)):
+            partial = dict(self.phrases.scores(term, phrase_weight))
+            for definition, score in self.meanings.scores(term, meaning_weight):
+                partial[definition] = partial.get(definition, 0) + score
+            for folder, score in self.paths.scores(term, path_weight):
+                if folder.loaded:
+                    for definition in folder.definitions:
+                        if definition in self.document_terms:
+                            partial[definition] = partial.get(definition, 0) + score
+            # Every definition matching the term in any field counts towards its document frequency
+            frequency = len(partial)
+            idf = math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for definition, score in partial.items():
+                scores[definition] = scores.get(definition, 0) + idf * score
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [(score, definition) for definition, score in best]
+
+
+# Flattened view of every definition in the tree with its folder and cached "Root/..." path.
+# Built once from the root folder and patched as folders and definitions are added or removed.
+# Lazily loaded folders are not forced open; their contents are added by folder_loaded.
+class DefinitionCatalog:
+    def __init__(self, root_folder, index_meanings=True):
+        self.root_folder = root_folder
+        self.folder_paths = {}
+        self.parents = {}
+        self.definition_folders = {}
+        # ID -> definition, so edits and moves addressed by ID never scan a definitions list
+        self.definitions_by_id = {}
+        # Duplicate phrases, across the whole tree and within each folder
+        self.phrase_keys = {}
+        self.phrases = PhraseIndex()
+        self.folder_phrases = {}
+        # Substring index, built on a thread of its own after the first search that can use it
+        # and kept up to date under text_lock; searches scan until it is ready. Without
+        # index_meanings it is never built: meanings are not kept in memory, and postings for
+        # all of them would outweigh the text.
+        self.index_meanings = index_meanings
+        self.text_index = None
+        self.text_pending = None  # Changes made while the index is built, replayed after
+        self.text_lock = threading.Lock()
+        # Built on the first fuzzy lookup, then kept up to date with the phrase index. Lookups
+        # run on search threads, so building, updating and reading it all hold fuzzy_lock.
+        self.fuzzy = None
+        self.fuzzy_lock = threading.Lock()
+        # Built on the first ranked search, then kept up to date like the other indexes; held
+        # by ranked_lock in the same way
+        self.ranked = None
+        self.ranked_lock = threading.Lock()
+        self.add_folder(root_folder, None)
+
+    def __len__(self):
+        return len(self.definition_folders)
+
+    def __iter__(self):
+        for definition, folder in self.definition_folders.items():
+            yield definition, self.folder_paths[folder]
+
+    def path_of(self, folder):
+        return self.folder_paths[folder]
+
+    def folder_of(self, definition):
+        return self.definition_folders[definition]
+
+    def definition(self, definition_id):
+        return self.definitions_by_id[definition_id]
+
+    def in_folder(self, definition, folder):
+        # True when the definition is in folder or any of its subfolders
+        ancestor = self.definition_folders.get(definition)
+        while ancestor is not None and ancestor is not folder:
+            ancestor = self.parents[ancestor]
+        return ancestor is not None
+
+    def add_folder(self, folder, parent):
+        self.parents[folder] = parent
+        if parent is None:
+            self.folder_paths[folder] = 'Root'
+        else:
+            self.folder_paths[folder] = f"{self.folder_paths[parent]}/{folder.name}"
+        with self.ranked_lock:
+            if self.ranked is not None:
+                self.ranked.add_folder(folder, self.folder_paths[folder])
+        if folder.loaded:
+            self.folder_loaded(folder)
+
+    def folder_loaded(self, folder):
+        self.add_definitions(folder, folder.definitions)
+        for subfolder in folder.subfolders:
+            self.add_folder(subfolder, folder)
+
+    def add_definitions(self, folder, definitions):
+        self.definition_folders.update(dict.fromkeys(definitions, folder))
+        self.definitions_by_id.update((definition.id, definition) for definition in definitions)
+        folder_phrases = self.folder_phrases.setdefault(folder, PhraseIndex())
+        for definition in definitions:
+            key = self.phrase_keys[definition] = normalize_phrase(definition.phrase)
+            self.phrases.add(key, definition)
+            folder_phrases.add(key, definition)
+        with self.ranked_lock:
+            if self.ranked is not None:
+                for definition in definitions:
+                    self.ranked.add(definition)
+        with self.fuzzy_lock:
+            if self.fuzzy is not None:
+                for definition in definitions:
+                    self.fuzzy.add(self.phrase_keys[definition])
+        self._text_change('add_many', list(definitions))
+
+    def remove_definitions(self, definitions):
+        for definition in definitions:
+            folder = self.definition_folders.pop(definition, None)
+            self.definitions_by_id.pop(definition.id, None)
+            key = self.phrase_keys.pop(definition, None)
+            if key is not None:
+                self.phrases.remove(key, definition)
+                self.folder_phrases[folder].remove(key, definition)
+                with self.fuzzy_lock:
+                    self._unfuzz(key)
+            with self.ranked_lock:
+                if self.ranked is not None:
+                    self.ranked.remove(definition)
+            self._text_change('remove', definition)
+
+    def move_definitions(self, definitions, folder):
+        # Only the folder changes; the text index and result order stay as they are
+        folder_phrases = self.folder_phrases.setdefault(folder, PhraseIndex())
+        for definition in definitions:
+            key = self.phrase_keys[definition]
+            self.folder_phrases[self.definition_folders[definition]].remove(key, definition)
+            folder_phrases.add(key, definition)
+            self.definition_folders[definition] = folder
+
+    def update_definition(self, definition):
+        old_key = self.phrase_keys.get(definition)
+        key = normalize_phrase(definition.phrase)
+        if old_key is not None and key != old_key:
+            folder_phrases = self.folder_phrases[self.definition_folders[definition]]
+            self.phrases.remove(old_key, definition)
+            folder_phrases.remove(old_key, definition)
+            self.phrase_keys[definition] = key
+            self.phrases.add(key, definition)
+            folder_phrases.add(key, definition)
+            with self.fuzzy_lock:
+                self._unfuzz(old_key)
+                if self.fuzzy is not None:
+                    self.fuzzy.add(key)
+        with self.ranked_lock:
+            if self.ranked is not None:
+                self.ranked.add(definition)
+        self._text_change('update', definition)
+
+    def _text_change(self, method, argument):
+        # Applies a TrigramIndex method to the index, or queues it while the index is built
+        with self.text_lock:
+            if self.text_index is not None:
+                getattr(self.text_index, method)(argument)
+            elif self.text_pending is not None:
+                self.text_pending.append((method, argument))
+
+    def _build_text_index(self, definitions):
+        text_index = TrigramIndex()
+        text_index.add_many(definitions)
+        with self.text_lock:
+            for method, argument in self.text_pending:
+                getattr(text_index, method)(argument)
+            self.text_index, self.text_pending = text_index, None
+
+    def _unfuzz(self, key):
+        # With fuzzy_lock held
+        if self.fuzzy is not None and key not in self.phrases.groups:
+            self.fuzzy.remove(key)
+
+    def plan_merge(self, folder, rows, policy):
+        return merge_rows(self.folder_phrases.get(folder, PhraseIndex()), rows, policy)
+
+    def duplicate_groups(self):
+        groups = []
+        for group in self.phrases.groups.values():
+            if isinstance(group, list):
+                groups.append(self._with_paths(group))
+        return groups
+
+    def _with_paths(self, definitions):
+        return [(definition, self.folder_paths[self.definition_folders[definition]])
+                for definition in definitions]
+
+    def similar(self, query, max_distance=None):
+        # Definitions whose normalized phrase, or one of its fuzzy_keys forms, is within
+        # max_distance edits of the query (by default fuzzy_distance of it), closest first
+        key = normalize_phrase(query)
+        if max_distance is None:
+            max_distance = fuzzy_distance(key)
+        with self.fuzzy_lock:
+            if self.fuzzy is None:
+                self.fuzzy = FuzzyIndex(list(self.phrases.groups))
+            found = self.fuzzy.find(key, max_distance)
+        found.sort(key=itemgetter(0))
+        folders = self.definition_folders
+        return [(definition, self.folder_paths[folders[definition]])
+                for _, phrase_key in found for definition in list(self.phrases.items(phrase_key))
+                if definition in folders]
+
+    def iter_similar(self, query, cancelled=None):
+        return iter(self.similar(query))
+
+    def ranked_search(self, query, limit=RANKED_RESULT_LIMIT):
+        # The best BM25 matches for the query's words, best first
+        with self.ranked_lock:
+            if self.ranked is None:
+                ranked = RankedIndex(self.index_meanings)
+                for folder, path in list(self.folder_paths.items()):
+                    ranked.add_folder(folder, path)
+                for definition in list(self.definition_folders):
+                    ranked.add(definition)
+                self.ranked = ranked
+            found = [definition for _, definition in self.ranked.top(query, limit)]
+        return self._with_paths([definition for definition in found if definition in self.definition_folders])
+
+    def iter_ranked(self, query, cancelled=None):
+        return iter(self.ranked_search(query))
+
+    def _candidates(self, query):
+        # Definitions that may contain the lowercased query, in result order: those sharing
+        # every n-gram of it, or every definition when the query is too short for one, meanings
+        # are not indexed or the index is not built yet. A copy either way, since searches walk
+        # it on a worker thread while the GUI thread edits.
+        if not ngrams(query) or not self.index_meanings:
+            return list(self.definition_folders)
+        with self.text_lock:
+            if self.text_index is not None:
+                return self.text_index.candidates(query)
+            if self.text_pending is None:
+                self.text_pending = []
+                threading.Thread(target=self._build_text_index, args=(list(self.definition_folders),),
+                                 daemon=True).start()
+        return list(self.definition_folders)
+
+    def iter_search(self, query, cancelled=None):
+        # Yields matches in result order, verifying candidates one at a time. cancelled is
+        # checked between candidates, so a scan that matches nothing can still be stopped.
+        query = query.lower()
+        for definition in self._candidates(query):
+            if cancelled is not None and cancelled():
+                return
+            folder = self.definition_folders.get(definition)
+            if folder is not None and text_matches(definition, query):
+                yield definition, self.folder_paths[folder]
+
+    def iter_filter(self, query, cancelled=None):
+        # Like iter_search, but a definition also matches when its folder path contains the query
+        query = query.lower()
+        if not query:
+            for definition, folder in list(self.definition_folders.items()):
+                if cancelled is not None and cancelled():
+                    return
+                yield definition, self.folder_paths[folder]
+            return
+        matched_folders = {folder for folder, path in list(self.folder_paths.items()) if query in path.lower()}
+        # Definitions of a matching folder need not share the query's n-grams, so then every
+        # definition is visited to keep them in result order
+        candidates = list(self.definition_folders) if matched_folders else self._candidates(query)
+        for definition in candidates:
+            if cancelled is not None and cancelled():
+                return
+            folder = self.definition_folders.get(definition)
+            if folder is None:
+                continue
+            if folder in matched_folders or text_matches(definition, query):
+                yield definition, self.folder_paths[folder]
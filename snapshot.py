@@ -0,0 +1,311 @@
+# Binary snapshot of the folder tree, an alternative to data.json that loads without parsing.
+#
+# Layout (little-endian):
+#   header      magic, format version, flags, journal_seq, table sizes, meanings generation,
+#               CRC-32 of everything after the header
+#   folders     one fixed-size record per folder in depth-first order, each pointing at its parent's
+#               record, its name and color in the string heap and its run of definition records
+#   definitions one fixed-size record per definition: id and (offset, length) of phrase and meaning
+#   strings     UTF-8 text addressed by (offset, length) from the tables above
+#
+# With FLAG_EXTERNAL_MEANINGS set, meaning (offset, length) pairs point into a separate,
+# append-only MeaningBlob file named after the snapshot and its meanings generation.
+import itertools
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+from json_stream import LoadProgress
+from models import Folder, restore_definitions, restore_mapped_definitions
+
+MAGIC = b'DEFSNAP\0'
+VERSION = 2
+HEADERS = {
+    # magic, version, flags, journal_seq, folders, definitions, string bytes, [meanings generation,] crc32
+    1: struct.Struct('<8sHHQQQQI'),
+    2: struct.Struct('<8sHHQQQQQI'),
+}
+HEADER = HEADERS[VERSION]
+FOLDER = struct.Struct('<qqQIQiQQ')  # id, parent record (-1 for the root), name off/len, color off/len, first definition, definition count
+DEFINITION = struct.Struct('<qQIQI')  # id, phrase off/len, meaning off/len
+FLAG_EXTERNAL_MEANINGS = 1
+NO_COLOR = -1
+PROGRESS_EVERY_DEFINITIONS = 100_000
+MEANINGS_SUFFIX = '.meanings'
+MEANING_CACHE_CHARS = 16 * 1024 * 1024  # Decoded meanings kept by a MeaningBlob's LRU cache
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class StringHeap:
+    def __init__(self):
+        self.data = bytearray()
+
+    def add(self, text):
+        encoded = text.encode('utf-8')
+        offset = len(self.data)
+        self.data += encoded
+        return offset, len(encoded)
+
+
+def meanings_path(snapshot_path, generation):
+    return f'{snapshot_path}{MEANINGS_SUFFIX}.{generation}'
+
+
+def pack_location(offset, length):
+    # One int per mapped definition instead of an (offset, length) tuple
+    return offset << 32 | length
+
+
+def unpack_location(location):
+    return location >> 32, location & 0xFFFFFFFF
+
+
+# Append-only file of UTF-8 meanings that is memory-mapped for reading. Bytes are never
+# rewritten in place, so a mapping stays valid while new meanings are appended, and
+# replacing the snapshot never touches a file that is mapped.
+class MeaningBlob:
+    def __init__(self, path, generation, cache_chars=MEANING_CACHE_CHARS):
+        self.path = path
+        self.generation = generation
+        self.file = open(path, 'a+b')
+        self.size = self.file.seek(0, os.SEEK_END)
+        self.mapped = None
+        self.mapped_size = 0
+        self.cache = OrderedDict()  # location -> meaning, least recently used first
+        self.cache_chars = cache_chars
+        self.cached_chars = 0
+        self.lock = threading.Lock()
+
+    def read(self, offset, length):
+        # Raw bytes; the caller holds the lock
+        if offset + length > self.mapped_size:
+            if self.mapped is not None:
+                self.mapped.close()
+            self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.mapped_size = len(self.mapped)
+        return self.mapped[offset:offset + length]
+
+    def get(self, location):
+        with self.lock:
+            meaning = self.cache.get(location)
+            if meaning is not None:
+                self.cache.move_to_end(location)
+                return meaning
+            offset, length = unpack_location(location)
+            if not length:
+                return ''
+            meaning = self.read(offset, length).decode('utf-8')
+            if len(meaning) <= self.cache_chars:
+                self.cache[location] = meaning
+                self.cached_chars += len(meaning)
+                while self.cached_chars > self.cache_chars:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.cached_chars -= len(evicted)
+            return meaning
+
+    def read_raw(self, location):
+        with self.lock:
+            offset, length = unpack_location(location)
+            return self.read(offset, length) if length else b''
+
+    def append(self, meanings, sync=True):
+        # Appends meanings (str or already encoded bytes); returns their (offset, length) pairs
+        encoded = [meaning if isinstance(meaning, bytes) else meaning.encode('utf-8') for meaning in meanings]
+        with self.lock:
+            pairs = []
+            for data in encoded:
+                pairs.append((self.size, len(data)))
+                self.size += len(data)
+            if encoded:
+                self.file.write(b''.join(encoded))
+        if sync:
+            self.sync()
+        return pairs
+
+    def sync(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.mapped is not None:
+                self.mapped.close()
+                self.mapped = None
+            self.file.close()
+
+
+def encode_snapshot(data, meanings=None):
+    # data is the dict tree of Folder.to_dict() plus its 'journal_seq'; returns the file contents.
+    # With a MeaningBlob, meanings go to the blob instead of the string heap; definitions whose
+    # meaning is already in it carry a 'location' in place of their 'meaning'.
+    strings = StringHeap()
+    folders = bytearray()
+    definitions = bytearray()
+    definition_count = 0
+    stack = [(data, -1)]
+    folder_count = 0
+    while stack:
+        folder, parent = stack.pop()
+        name_offset, name_length = strings.add(folder['name'])
+        if folder.get('color') is None:
+            color_offset, color_length = 0, NO_COLOR
+        else:
+            color_offset, color_length = strings.add(folder['color'])
+        folder_definitions = folder.get('definitions', [])
+        folders += FOLDER.pack(folder['id'], parent, name_offset, name_length, color_offset, color_length,
+                               definition_count, len(folder_definitions))
+        if meanings is None:
+            for definition in folder_definitions:
+                definitions += DEFINITION.pack(definition['id'], *strings.add(definition['phrase']),
+                                               *strings.add(definition['meaning']))
+        else:
+            appended = iter(meanings.append([definition['meaning'] for definition in folder_definitions
+                                             if 'location' not in definition], sync=False))
+            for definition in folder_definitions:
+                location = definition.get('location')
+                pair = next(appended) if location is None else unpack_location(location)
+                definitions += DEFINITION.pack(definition['id'], *strings.add(definition['phrase']), *pair)
+        definition_count += len(folder_definitions)
+        # Reversed so that subfolders come off the stack, and into the table, in their original order
+        stack.extend((subfolder, folder_count) for subfolder in reversed(folder.get('subfolders', [])))
+        folder_count += 1
+    body = folders + definitions + strings.data
+    if meanings is None:
+        flags, generation = 0, 0
+    else:
+        # The snapshot must never point at meanings that could still be lost in a crash
+        meanings.sync()
+        flags, generation = FLAG_EXTERNAL_MEANINGS, meanings.generation
+    header = HEADER.pack(MAGIC, VERSION, flags, data.get('journal_seq', 0), folder_count, definition_count,
+                         len(strings.data), generation, zlib.crc32(body))
+    return header + body
+
+
+def read_header(buffer):
+    if len(buffer) < HEADERS[1].size:
+        raise SnapshotError('Snapshot is truncated')
+    magic, version = struct.unpack_from('<8sH', buffer)
+    if magic != MAGIC:
+        raise SnapshotError('Not a definitions snapshot')
+    if version not in HEADERS:
+        raise SnapshotError(f'Unsupported snapshot version {version}')
+    header = HEADERS[version]
+    if len(buffer) < header.size:
+        raise SnapshotError('Snapshot is truncated')
+    fields = header.unpack_from(buffer)
+    return {'size': header.size, 'flags': fields[2], 'journal_seq': fields[3], 'folders': fields[4],
+            'definitions': fields[5], 'string_bytes': fields[6], 'generation': fields[7] if version >= 2 else 0,
+            'checksum': fields[-1]}
+
+
+def decode_snapshot(buffer, on_progress=None, meanings=None):
+    # Builds the Folder tree from snapshot bytes (or an mmap); returns (root folder, extras).
+    # For a snapshot with external meanings, meanings is its MeaningBlob and the definitions
+    # are MappedDefinitions reading from it. Otherwise meanings come from the string heap.
+    header = read_header(buffer)
+    folders_start = header['size']
+    definitions_start = folders_start + header['folders'] * FOLDER.size
+    strings_start = definitions_start + header['definitions'] * DEFINITION.size
+    if len(buffer) != strings_start + header['string_bytes']:
+        raise SnapshotError('Snapshot is truncated')
+    view = memoryview(buffer)
+    folder_table = view[folders_start:definitions_start]
+    definition_table = view[definitions_start:strings_start]
+    strings = view[strings_start:]
+    folder_records = FOLDER.iter_unpack(folder_table)
+    definition_records = DEFINITION.iter_unpack(definition_table)
+    live_meaning_bytes = 0
+    try:
+        if zlib.crc32(view[folders_start:]) != header['checksum']:
+            raise SnapshotError('Snapshot checksum mismatch')
+        progress = LoadProgress(len(buffer))
+        next_report = PROGRESS_EVERY_DEFINITIONS
+        folders = []
+        for record in folder_records:
+            folder_id, parent, name_offset, name_length, color_offset, color_length, _, count = record
+            color = None if color_length == NO_COLOR else str(strings[color_offset:color_offset + color_length],
+                                                              'utf-8')
+            folder = Folder(str(strings[name_offset:name_offset + name_length], 'utf-8'), color, id=folder_id)
+            records = itertools.islice(definition_records, count)
+            if meanings is None:
+                folder.definitions = restore_definitions(
+                    (definition_id, str(strings[phrase_offset:phrase_offset + phrase_length], 'utf-8'),
+                     str(strings[meaning_offset:meaning_offset + meaning_length], 'utf-8'))
+                    for definition_id, phrase_offset, phrase_length, meaning_offset, meaning_length in records)
+            else:
+                records = list(records)
+                live_meaning_bytes += sum(record[4] for record in records)
+                folder.definitions = restore_mapped_definitions(
+                    ((definition_id, str(strings[phrase_offset:phrase_offset + phrase_length], 'utf-8'),
+                      pack_location(meaning_offset, meaning_length))
+                     for definition_id, phrase_offset, phrase_length, meaning_offset, meaning_length in records),
+                    meanings)
+            if parent >= 0:
+                folders[parent].subfolders.append(folder)
+            folders.append(folder)
+            progress.folders += 1
+            progress.definitions += count
+            if on_progress is not None and progress.definitions >= next_report:
+                next_report = progress.definitions + PROGRESS_EVERY_DEFINITIONS
+                progress.bytes_read = len(buffer) * progress.definitions // max(header['definitions'], 1)
+                on_progress(progress)
+    finally:
+        # Release every view into the buffer, so that an mmap can be closed even after an error
+        del folder_records, definition_records
+        for part in (folder_table, definition_table, strings, view):
+            part.release()
+    if not folders:
+        raise SnapshotError('Snapshot has no root folder')
+    if on_progress is not None:
+        progress.bytes_read = progress.total_bytes
+        on_progress(progress)
+    return folders[0], {'journal_seq': header['journal_seq'], 'id': folders[0].id,
+                        'live_meaning_bytes': live_meaning_bytes}
+
+
+def iter_mapped(root_folder):
+    # Definitions in the tree whose meaning is still only in a blob
+    stack = [root_folder]
+    while stack:
+        folder = stack.pop()
+        for definition in folder.definitions:
+            if getattr(definition, 'location', None) is not None:
+                yield definition
+        stack.extend(folder.subfolders)
+
+
+def load_snapshot(path, on_progress=None, lazy_meanings=False):
+    # Returns (root folder, extras). When the meanings are in a blob file and lazy_meanings is
+    # set, definitions read them on demand and extras['meanings'] is the open MeaningBlob;
+    # otherwise every meaning is decoded now.
+    with open(path, 'rb') as f:
+        if not f.seek(0, os.SEEK_END):
+            raise SnapshotError('Snapshot is empty')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header = read_header(mapped)
+            if not header['flags'] & FLAG_EXTERNAL_MEANINGS:
+                return decode_snapshot(mapped, on_progress)
+            blob_path = meanings_path(path, header['generation'])
+            if not os.path.exists(blob_path):
+                raise SnapshotError(f'Missing meanings file {blob_path}')
+            meanings = MeaningBlob(blob_path, header['generation'])
+            try:
+                root_folder, extras = decode_snapshot(mapped, on_progress, meanings)
+                if not lazy_meanings:
+                    for definition in iter_mapped(root_folder):
+                        definition.meaning = meanings.read_raw(definition.location).decode('utf-8')
+            except BaseException:
+                meanings.close()
+                raise
+    if lazy_meanings:
+        extras['meanings'] = meanings
+    else:
+        meanings.close()
+    return root_folder, extras
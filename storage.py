@@ -0,0 +1,799 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from json_stream import load_folder
+from models import Definition, Folder, ids, iter_folders
+from search_index import (RANK_FIELD_WEIGHTS, RANKED_RESULT_LIMIT, FuzzyIndex, PhraseIndex, duplicate_groups,
+                          fuzzy_distance, normalize_phrase, terms)
+from snapshot import (MEANINGS_SUFFIX, MeaningBlob, encode_snapshot, load_snapshot, meanings_path, pack_location)
+
+
+DATA_FILE = 'data.json'
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+LOCK_POLL_SECONDS = 0.5
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024  # Fold the journal into the snapshot past this size
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+SNAPSHOT_EXTENSIONS = ('.snap',)
+LAZY_MEANINGS = False  # Keep the meanings of a .snap library in a mapped file and read them on demand
+MEANING_RECLAIM_MIN_BYTES = 16 * 1024 * 1024  # Rewrite a meanings file this large once half of it is garbage
+
+
+# Exclusive lock on a file next to a library, held by the one process that may change it. Each
+# process numbers journal records from its own counter, so with two writers the first
+# compaction would trim the other's records. The OS drops the lock when its process exits.
+class WriterLock:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def acquire(self, wait=False):
+        # True once held; False when another process holds it and wait is not set
+        if self.file is not None:
+            return True
+        f = open(self.path, 'a+b')
+        while True:
+            try:
+                if os.name == 'nt':
+                    import msvcrt
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if wait:
+                    time.sleep(LOCK_POLL_SECONDS)
+                    continue
+                f.close()
+                return False
+            self.file = f
+            return True
+
+    def release(self):
+        if self.file is not None:
+            # Closing the file releases the lock on every platform
+            self.file.close()
+            self.file = None
+
+
+def write_atomic(path, write, binary=False):
+    # Write to a temporary file, fsync it and rename it over the target, so a crash
+    # mid-write leaves either the old file or the new one, never a truncated mix
+    temp_path = path + '.tmp'
+    with (open(temp_path, 'wb') if binary else open(temp_path, 'w', encoding='utf-8')) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+# Background thread that writes snapshots. Requests that arrive while a write is pending or
+# running are coalesced: only the most recent snapshot is written.
+class SnapshotWriter:
+    def __init__(self, write, on_status=None):
+        self.write = write
+        self.on_status = on_status
+        self.status = 'saved'
+        self.pending = None
+        self.writing = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _set_status(self, status):
+        self.status = status
+        if self.on_status is not None:
+            self.on_status(status)
+
+    def submit(self, data):
+        with self.condition:
+            self.pending = data
+            self._set_status('dirty')
+            self.condition.notify_all()
+
+    def idle(self):
+        with self.condition:
+            return self.pending is None and not self.writing
+
+    def flush(self):
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                data, self.pending = self.pending, None
+                self.writing = True
+                self._set_status('saving')
+            try:
+                self.write(data)
+                status = 'saved'
+            except Exception as e:
+                print(f"Failed to save data: {e}")
+                status = 'error'
+            with self.condition:
+                self.writing = False
+                self._set_status('dirty' if self.pending is not None else status)
+                self.condition.notify_all()
+
+
+def index_tree(root_folder):
+    objects = {}
+    stack = [root_folder]
+    while stack:
+        folder = stack.pop()
+        objects[folder.id] = folder
+        objects.update((definition.id, definition) for definition in folder.definitions)
+        stack.extend(folder.subfolders)
+    return objects
+
+
+def apply_change(change, objects):
+    # Records address folders and definitions by ID; objects maps IDs to both
+    folder = objects[change['folder']]
+    op = change['op']
+    if op == 'add_folder':
+        new_folder = Folder(change['name'], change.get('color'), id=change.get('id'))
+        folder.subfolders.append(new_folder)
+        objects[new_folder.id] = new_folder
+    elif op == 'add_definitions':
+        objects.update((d.id, d) for d in folder.add_definitions(change['definitions']))
+    elif op == 'edit_definition':
+        definition = objects[change['definition']]
+        definition.phrase = change['phrase']
+        definition.meaning = change['meaning']
+    elif op == 'edit_definitions':
+        for definition_id, phrase, meaning in change['definitions']:
+            definition = objects[definition_id]
+            definition.phrase = phrase
+            definition.meaning = meaning
+    elif op == 'delete_definitions':
+        deleted = set(change['definitions'])
+        folder.definitions = [d for d in folder.definitions if d.id not in deleted]
+    elif op == 'move_definitions':
+        moved = set(change['definitions'])
+        source = objects[change['source']]
+        folder.definitions.extend(d for d in source.definitions if d.id in moved)
+        source.definitions = [d for d in source.definitions if d.id not in moved]
+    elif op == 'set_color':
+        folder.color = change['color']
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+
+# data.json snapshot plus an append-only journal of changes made since it was written.
+# Each edit appends one small record; the journal is folded back into the snapshot once it
+# grows past JOURNAL_COMPACT_BYTES. The snapshot stores the sequence number of the last
+# change it contains, so records that were already folded in are skipped on replay.
+class JsonStore:
+    text_search = False
+    lazy_meanings = False
+
+    def __init__(self, data_file, compact_bytes=JOURNAL_COMPACT_BYTES, on_status=None, on_progress=None):
+        self.data_file = data_file
+        self.on_progress = on_progress
+        self.journal_file = data_file + JOURNAL_SUFFIX
+        self.compact_bytes = compact_bytes
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.journal = None
+        self.on_load = None
+        self.unsaved_ids = None  # Root of a tree loaded without IDs, until they are written out
+        self.writer = SnapshotWriter(self.write_snapshot, on_status)
+        self.writer_lock = WriterLock(data_file + LOCK_SUFFIX)
+
+    def lock_writer(self, wait=False):
+        # Claims the library for this process before it records or compacts anything; False
+        # when another process, such as the GUI or a CLI import, has it
+        return self.writer_lock.acquire(wait)
+
+    def load(self):
+        root_folder, extras = None, {}
+        try:
+            root_folder, extras = self.read_snapshot()
+        except FileNotFoundError:
+            pass
+        if root_folder is None:
+            root_folder = Folder('Root')
+        snapshot_seq = self.seq = extras.get('journal_seq', 0)
+        objects = None
+        for change in self.read_journal():
+            if change['seq'] > snapshot_seq:
+                if objects is None:
+                    objects = index_tree(root_folder)
+                apply_change(change, objects)
+                self.seq = change['seq']
+        # IDs handed out for a snapshot without them would differ on the next start; they are
+        # written out with the first change, so loading alone leaves the file as it is
+        self.unsaved_ids = root_folder if extras.get('id') is None else None
+        return root_folder
+
+    def read_journal(self):
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final record from a crash mid-append
+                        return
+        except FileNotFoundError:
+            return
+
+    def record(self, op, folder, **fields):
+        if self.unsaved_ids is not None:
+            # The tree already holds the change, so a snapshot with the IDs takes the place of
+            # a record that would refer to IDs the file does not have
+            with self.lock:
+                self.seq += 1
+            self.compact(self.unsaved_ids)
+            return
+        with self.lock:
+            self.seq += 1
+            change = {'seq': self.seq, 'op': op, 'folder': folder, **fields}
+            if self.journal is None:
+                self.journal = open(self.journal_file, 'a', encoding='utf-8')
+            self.journal.write(json.dumps(change, ensure_ascii=False) + '\n')
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def journal_size(self):
+        try:
+            return os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            return 0
+
+    def needs_compaction(self):
+        return self.writer.idle() and self.journal_size() > self.compact_bytes
+
+    def compact(self, root_folder, background=False):
+        # The snapshot is taken on the calling thread so it is consistent with self.seq
+        with self.lock:
+            data = self.capture(root_folder)
+            data['journal_seq'] = self.seq
+            self.unsaved_ids = None
+        if background:
+            self.writer.submit(data)
+        else:
+            self.writer.flush()
+            self.write_snapshot(data)
+
+    def save_tree(self, root_folder):
+        self.compact(root_folder)
+
+    def subtree_counts(self):
+        # Every folder is loaded with the snapshot, so sizes come from the tree itself
+        return None
+
+    def close(self):
+        self.writer.flush()
+        with self.lock:
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+        self.writer_lock.release()
+
+    def capture(self, root_folder):
+        return root_folder.to_dict()
+
+    def read_snapshot(self):
+        return load_folder(self.data_file, self.on_progress)
+
+    def write_snapshot(self, data):
+        write_atomic(self.data_file, lambda f: json.dump(data, f, indent=4))
+        self.trim_journal(data['journal_seq'])
+
+    def trim_journal(self, snapshot_seq):
+        # Keep only the records appended after the snapshot was taken
+        with self.lock:
+            remaining = [change for change in self.read_journal() if change['seq'] > snapshot_seq]
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if not remaining:
+                if os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+                return
+            write_atomic(self.journal_file, lambda f: f.writelines(
+                json.dumps(change, ensure_ascii=False) + '\n' for change in remaining))
+
+
+# Same journal and compaction as JsonStore, with the snapshot in the binary format of
+# snapshot.py, which loads without any parsing.
+#
+# With lazy_meanings, meanings live in an append-only MeaningBlob next to the snapshot and
+# only phrases and folders stay in memory. Compaction appends new and edited meanings to the
+# blob and writes a snapshot that points at them; meanings that were already in the blob
+# are not copied again. Once most of the blob is garbage it is rewritten as the next
+# generation, and files of older generations are removed.
+class BinaryStore(JsonStore):
+    def __init__(self, data_file, lazy_meanings=None, **kwargs):
+        super().__init__(data_file, **kwargs)
+        # None follows LAZY_MEANINGS as it is when the store is opened, so setting it at runtime works
+        self.lazy_meanings = LAZY_MEANINGS if lazy_meanings is None else lazy_meanings
+        self.meanings = None
+        self.live_meaning_bytes = 0
+
+    def load(self):
+        self.close_meanings()
+        root_folder = super().load()
+        if not self.lazy_meanings:
+            return root_folder
+        if self.meanings is None:
+            # The meanings are still inline: move them out to a blob, then load again so
+            # that the definitions read from it instead of holding them
+            generation = self.last_generation() + 1
+            self.meanings = MeaningBlob(meanings_path(self.data_file, generation), generation)
+            self.compact(root_folder)
+            return self.load()
+        if (self.meanings.size > MEANING_RECLAIM_MIN_BYTES
+                and self.live_meaning_bytes * 2 < self.meanings.size):
+            self.reclaim_meanings(root_folder)
+        return root_folder
+
+    def read_snapshot(self):
+        root_folder, extras = load_snapshot(self.data_file, self.on_progress, self.lazy_meanings)
+        self.meanings = extras.get('meanings')
+        self.live_meaning_bytes = extras.get('live_meaning_bytes', 0)
+        return root_folder, extras
+
+    def capture(self, root_folder):
+        if self.meanings is None:
+            return root_folder.to_dict()
+        return self.capture_folder(root_folder)
+
+    def capture_folder(self, folder):
+        # Like Folder.to_dict, but a meaning that is already in the blob is passed by location
+        definitions = []
+        for definition in folder.definitions:
+            location = getattr(definition, 'location', None)
+            if location is not None and definition.blob is self.meanings:
+                definitions.append({'id': definition.id, 'phrase': definition.phrase, 'location': location})
+            else:
+                definitions.append(definition.to_dict())
+        return {'id': folder.id, 'name': folder.name, 'color': folder.color,
+                'subfolders': [self.capture_folder(subfolder) for subfolder in folder.subfolders],
+                'definitions': definitions}
+
+    def write_snapshot(self, data):
+        encoded = encode_snapshot(data, self.meanings)
+        write_atomic(self.data_file, lambda f: f.write(encoded), binary=True)
+        self.trim_journal(data['journal_seq'])
+        current = None if self.meanings is None else self.meanings.path
+        for path in self.meaning_files():
+            if path != current:
+                os.remove(path)
+
+    def meaning_files(self):
+        return glob.glob(glob.escape(self.data_file) + MEANINGS_SUFFIX + '.*')
+
+    def last_generation(self):
+        generations = [int(path.rsplit('.', 1)[1]) for path in self.meaning_files()
+                       if path.rsplit('.', 1)[1].isdigit()]
+        return max(generations, default=0)
+
+    def reclaim_meanings(self, root_folder):
+        # Copy the live meanings into a new generation and point the definitions at it
+        old, generation = self.meanings, self.meanings.generation + 1
+        new = MeaningBlob(meanings_path(self.data_file, generation), generation)
+        for folder, _ in iter_folders(root_folder):
+            mapped = [definition for definition in folder.definitions
+                      if getattr(definition, 'location', None) is not None]
+            pairs = new.append([old.read_raw(definition.location) for definition in mapped], sync=False)
+            for definition, pair in zip(mapped, pairs):
+                definition.blob = new
+                definition.location = pack_location(*pair)
+        new.sync()
+        self.meanings = new
+        old.close()
+        self.compact(root_folder)
+
+    def close_meanings(self):
+        if self.meanings is not None:
+            self.meanings.close()
+            self.meanings = None
+
+    def close(self):
+        super().close()
+        self.close_meanings()
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY,
+    parent_id INTEGER REFERENCES folders(id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    color TEXT
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders(parent_id, position);
+
+CREATE TABLE IF NOT EXISTS definitions (
+    id INTEGER PRIMARY KEY,
+    folder_id INTEGER NOT NULL REFERENCES folders(id),
+    position INTEGER NOT NULL,
+    phrase TEXT NOT NULL,
+    meaning TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS definitions_folder ON definitions(folder_id, position);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS definitions_fts USING fts5(
+    phrase, meaning, content='definitions', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS definitions_ai AFTER INSERT ON definitions BEGIN
+    INSERT INTO definitions_fts(rowid, phrase, meaning) VALUES (new.id, new.phrase, new.meaning);
+END;
+CREATE TRIGGER IF NOT EXISTS definitions_ad AFTER DELETE ON definitions BEGIN
+    INSERT INTO definitions_fts(definitions_fts, rowid, phrase, meaning)
+    VALUES ('delete', old.id, old.phrase, old.meaning);
+END;
+CREATE TRIGGER IF NOT EXISTS definitions_au AFTER UPDATE ON definitions BEGIN
+    INSERT INTO definitions_fts(definitions_fts, rowid, phrase, meaning)
+    VALUES ('delete', old.id, old.phrase, old.meaning);
+    INSERT INTO definitions_fts(rowid, phrase, meaning) VALUES (new.id, new.phrase, new.meaning);
+END;
+
+-- Word-level index used by ranked searches, where bm25() should score whole words
+CREATE VIRTUAL TABLE IF NOT EXISTS definitions_words USING fts5(
+    phrase, meaning, content='definitions', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS definitions_words_ai AFTER INSERT ON definitions BEGIN
+    INSERT INTO definitions_words(rowid, phrase, meaning) VALUES (new.id, new.phrase, new.meaning);
+END;
+CREATE TRIGGER IF NOT EXISTS definitions_words_ad AFTER DELETE ON definitions BEGIN
+    INSERT INTO definitions_words(definitions_words, rowid, phrase, meaning)
+    VALUES ('delete', old.id, old.phrase, old.meaning);
+END;
+CREATE TRIGGER IF NOT EXISTS definitions_words_au AFTER UPDATE ON definitions BEGIN
+    INSERT INTO definitions_words(definitions_words, rowid, phrase, meaning)
+    VALUES ('delete', old.id, old.phrase, old.meaning);
+    INSERT INTO definitions_words(rowid, phrase, meaning) VALUES (new.id, new.phrase, new.meaning);
+END;
+"""
+
+
+def like_pattern(query):
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+# SQLite database with folders stored as an adjacency list, definitions in their own table
+# and an FTS5 trigram index over phrase and meaning. Every journal operation is applied as
+# one small transaction, and text searches run as queries instead of scanning the tree.
+# Folders are hydrated lazily: a folder's subfolders and definitions are only read when
+# something first touches them, and on_load is then called with the folder.
+class SqliteStore:
+    text_search = True
+    lazy_meanings = False
+
+    def __init__(self, data_file, on_status=None):
+        self.data_file = data_file
+        self.on_status = on_status
+        self.on_load = None
+        self.connection = self.connect()
+        has_word_index = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'definitions_words'").fetchone() is not None
+        self.connection.executescript(SQLITE_SCHEMA)
+        if not has_word_index:
+            # Databases from before ranked search: fill the new index from the existing rows
+            with self.connection:
+                self.connection.execute("INSERT INTO definitions_words(definitions_words) VALUES ('rebuild')")
+        self.folder_paths = {}  # folder id -> "Root/..." path
+        # Normalized phrase -> definition IDs and a FuzzyIndex over the phrases, built on the
+        # first fuzzy lookup on a search thread and then kept up to date by record. Both hold
+        # fuzzy_lock, so a change is either in the rows the build reads or applied after it.
+        self.fuzzy = None
+        self.fuzzy_ids = None
+        self.fuzzy_lock = threading.Lock()
+        # New rows are inserted with IDs from the shared allocator, so claim the ones already in use
+        for table in ('folders', 'definitions'):
+            ids.claim(self.connection.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}').fetchone()[0])
+
+    def connect(self):
+        connection = sqlite3.connect(self.data_file)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def root_id(self):
+        row = self.connection.execute('SELECT id FROM folders WHERE parent_id IS NULL').fetchone()
+        if row is not None:
+            return row[0]
+        with self.connection:
+            return self.connection.execute(
+                "INSERT INTO folders(id, parent_id, position, name) VALUES (?, NULL, 0, 'Root')",
+                (ids.claim(),)).lastrowid
+
+    def load(self):
+        root_id = self.root_id()
+        self.folder_paths = {root_id: 'Root'}
+        for folder_id, path in self.connection.execute(
+                '''WITH RECURSIVE tree(id, path) AS (
+                       SELECT id, 'Root' FROM folders WHERE parent_id IS NULL
+                       UNION ALL
+                       SELECT folders.id, tree.path || '/' || folders.name
+                       FROM folders JOIN tree ON folders.parent_id = tree.id
+                   ) SELECT id, path FROM tree'''):
+            self.folder_paths[folder_id] = path
+        return Folder('Root', self.connection.execute(
+            'SELECT color FROM folders WHERE id = ?', (root_id,)).fetchone()[0], self.loader(root_id), root_id)
+
+    def loader(self, folder_id):
+        return lambda folder: self.load_folder(folder, folder_id)
+
+    def load_folder(self, folder, folder_id):
+        folder.subfolders = [
+            Folder(name, color, self.loader(child_id), child_id) for child_id, name, color in self.connection.execute(
+                'SELECT id, name, color FROM folders WHERE parent_id = ? ORDER BY position', (folder_id,))]
+        folder.definitions = [
+            Definition(phrase, meaning, definition_id) for definition_id, phrase, meaning in self.connection.execute(
+                'SELECT id, phrase, meaning FROM definitions WHERE folder_id = ? ORDER BY position', (folder_id,))]
+        if self.on_load is not None:
+            self.on_load(folder)
+
+    def subtree_counts(self):
+        # Folder ID -> definitions in the folder and everything below it, so folders that were
+        # never opened can be sized without loading them
+        parents = dict(self.connection.execute('SELECT id, parent_id FROM folders'))
+        totals = dict.fromkeys(parents, 0)
+        for folder_id, count in self.connection.execute(
+                'SELECT folder_id, COUNT(*) FROM definitions GROUP BY folder_id'):
+            while folder_id is not None:
+                totals[folder_id] += count
+                folder_id = parents[folder_id]
+        return totals
+
+    def save_tree(self, root_folder):
+        # Replace the whole database with the given tree, e.g. when converting from data.json
+        with self.connection:
+            self.connection.execute('DELETE FROM definitions')
+            self.connection.execute('DELETE FROM folders')
+            self._insert_folder(root_folder, None, 0)
+        self.load()
+
+    def _insert_folder(self, folder, parent_id, position):
+        self.connection.execute(
+            'INSERT INTO folders(id, parent_id, position, name, color) VALUES (?, ?, ?, ?, ?)',
+            (folder.id, parent_id, position, folder.name, folder.color))
+        self.connection.executemany(
+            'INSERT INTO definitions(id, folder_id, position, phrase, meaning) VALUES (?, ?, ?, ?, ?)',
+            ((d.id, folder.id, i, d.phrase, d.meaning) for i, d in enumerate(folder.definitions)))
+        for i, subfolder in enumerate(folder.subfolders):
+            self._insert_folder(subfolder, folder.id, i)
+
+    def next_position(self, table, column, folder_id):
+        row = self.connection.execute(
+            f'SELECT MAX(position) FROM {table} WHERE {column} = ?', (folder_id,)).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def record(self, op, folder_id, **fields):
+        with self.fuzzy_lock:
+            self._record(op, folder_id, fields)
+        if self.on_status is not None:
+            self.on_status('saved')
+
+    def _record(self, op, folder_id, fields):
+        replaced = ()
+        if self.fuzzy is not None and op in ('edit_definition', 'edit_definitions', 'delete_definitions'):
+            if op == 'edit_definition':
+                changed = [fields['definition']]
+            elif op == 'edit_definitions':
+                changed = [row[0] for row in fields['definitions']]
+            else:
+                changed = fields['definitions']
+            replaced = self._phrases_of(self.connection, changed)
+        with self.connection:
+            if op == 'add_folder':
+                position = self.next_position('folders', 'parent_id', folder_id)
+                self.connection.execute(
+                    'INSERT INTO folders(id, parent_id, position, name, color) VALUES (?, ?, ?, ?, ?)',
+                    (fields['id'], folder_id, position, fields['name'], fields.get('color')))
+                self.folder_paths[fields['id']] = f"{self.folder_paths[folder_id]}/{fields['name']}"
+            elif op == 'add_definitions':
+                position = self.next_position('definitions', 'folder_id', folder_id)
+                self.connection.executemany(
+                    'INSERT INTO definitions(id, folder_id, position, phrase, meaning) VALUES (?, ?, ?, ?, ?)',
+                    ((definition_id, folder_id, position + i, phrase, meaning)
+                     for i, (phrase, meaning, definition_id) in enumerate(fields['definitions'])))
+            elif op == 'edit_definition':
+                self.connection.execute(
+                    'UPDATE definitions SET phrase = ?, meaning = ? WHERE id = ?',
+                    (fields['phrase'], fields['meaning'], fields['definition']))
+            elif op == 'edit_definitions':
+                self.connection.executemany(
+                    'UPDATE definitions SET phrase = ?, meaning = ? WHERE id = ?',
+                    ((phrase, meaning, definition_id) for definition_id, phrase, meaning in fields['definitions']))
+            elif op == 'delete_definitions':
+                self.connection.executemany(
+                    'DELETE FROM definitions WHERE id = ?', ((i,) for i in fields['definitions']))
+            elif op == 'move_definitions':
+                position = self.next_position('definitions', 'folder_id', folder_id)
+                self.connection.executemany(
+                    'UPDATE definitions SET folder_id = ?, position = ? WHERE id = ?',
+                    ((folder_id, position + i, definition_id)
+                     for i, definition_id in enumerate(fields['definitions'])))
+            elif op == 'set_color':
+                self.connection.execute('UPDATE folders SET color = ? WHERE id = ?', (fields['color'], folder_id))
+            else:
+                raise ValueError(f"Unknown journal operation: {op}")
+        if self.fuzzy is not None:
+            if op == 'add_definitions':
+                added = [(definition_id, phrase) for phrase, _, definition_id in fields['definitions']]
+            elif op == 'edit_definition':
+                added = [(fields['definition'], fields['phrase'])]
+            elif op == 'edit_definitions':
+                added = [(definition_id, phrase) for definition_id, phrase, _ in fields['definitions']]
+            else:
+                added = ()
+            self._update_fuzzy(replaced, added)
+
+    def _phrases_of(self, connection, definition_ids):
+        rows = []
+        for start in range(0, len(definition_ids), 500):
+            chunk = definition_ids[start:start + 500]
+            rows.extend(connection.execute(
+                f"SELECT id, phrase FROM definitions WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+        return rows
+
+    def _update_fuzzy(self, removed, added):
+        for definition_id, phrase in removed:
+            key = normalize_phrase(phrase)
+            self.fuzzy_ids.remove(key, definition_id)
+            if key not in self.fuzzy_ids.groups:
+                self.fuzzy.remove(key)
+        for definition_id, phrase in added:
+            key = normalize_phrase(phrase)
+            self.fuzzy_ids.add(key, definition_id)
+            self.fuzzy.add(key)
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, root_folder, background=False):
+        # Changes are committed as they are recorded; only tidy up the full-text indexes
+        with self.connection:
+            self.connection.execute("INSERT INTO definitions_fts(definitions_fts) VALUES ('optimize')")
+            self.connection.execute("INSERT INTO definitions_words(definitions_words) VALUES ('optimize')")
+        if self.on_status is not None:
+            self.on_status('saved')
+
+    def lock_writer(self, wait=False):
+        # SQLite serializes writers itself and every change is a transaction of its own
+        return True
+
+    def close(self):
+        self.connection.close()
+
+    def _matching_rows(self, connection, query, folder_ids=()):
+        if len(query) >= 3:
+            conditions = ['id IN (SELECT rowid FROM definitions_fts WHERE definitions_fts MATCH ?)']
+            params = ['"' + query.replace('"', '""') + '"']
+        else:
+            # The trigram tokenizer needs at least three characters
+            pattern = like_pattern(query)
+            conditions = ["phrase LIKE ? ESCAPE '\\'", "meaning LIKE ? ESCAPE '\\'"]
+            params = [pattern, pattern]
+        if folder_ids:
+            conditions.append(f"folder_id IN ({', '.join('?' * len(folder_ids))})")
+            params.extend(folder_ids)
+        return connection.execute(
+            f"SELECT id, folder_id, phrase, meaning FROM definitions WHERE {' OR '.join(conditions)} ORDER BY id",
+            params)
+
+    def _iter_rows(self, query, match_paths, cancelled=None):
+        # Searches run on worker threads, so each one opens its own read connection
+        connection = self.connect()
+        try:
+            if not query:
+                rows = connection.execute('SELECT id, folder_id, phrase, meaning FROM definitions ORDER BY id')
+            else:
+                folder_ids = ()
+                if match_paths:
+                    folder_ids = [folder_id for folder_id, path in self.folder_paths.items()
+                                  if query.lower() in path.lower()]
+                rows = self._matching_rows(connection, query, folder_ids)
+            for definition_id, folder_id, phrase, meaning in rows:
+                if cancelled is not None and cancelled():
+                    return
+                yield Definition(phrase, meaning, definition_id), self.folder_paths[folder_id]
+        finally:
+            connection.close()
+
+    def iter_search(self, query, cancelled=None):
+        return self._iter_rows(query, False, cancelled)
+
+    def iter_filter(self, query, cancelled=None):
+        return self._iter_rows(query, True, cancelled)
+
+    def iter_ranked(self, query, cancelled=None, limit=RANKED_RESULT_LIMIT):
+        # FTS5's own bm25() over the word index, weighted like the in-memory ranking;
+        # folder paths are not part of the index, so only phrase and meaning are scored
+        words = terms(query)
+        if not words:
+            yield from self.iter_search(query)
+            return
+        connection = self.connect()
+        try:
+            phrase_weight, meaning_weight, _ = RANK_FIELD_WEIGHTS
+            rows = connection.execute(
+                '''SELECT definitions.id, folder_id, definitions.phrase, definitions.meaning
+                   FROM definitions_words JOIN definitions ON definitions.id = definitions_words.rowid
+                   WHERE definitions_words MATCH ? ORDER BY bm25(definitions_words, ?, ?) LIMIT ?''',
+                (' OR '.join(f'"{word}"' for word in words), phrase_weight, meaning_weight, limit))
+            for definition_id, folder_id, phrase, meaning in rows:
+                yield Definition(phrase, meaning, definition_id), self.folder_paths[folder_id]
+        finally:
+            connection.close()
+
+    def iter_similar(self, query, cancelled=None):
+        # Fuzzy phrase lookup over the whole database, closest first and then by ID
+        connection = self.connect()
+        try:
+            with self.fuzzy_lock:
+                if self.fuzzy is None:
+                    phrases = PhraseIndex()
+                    for definition_id, phrase in connection.execute('SELECT id, phrase FROM definitions'):
+                        phrases.add(normalize_phrase(phrase), definition_id)
+                    self.fuzzy_ids = phrases
+                    self.fuzzy = FuzzyIndex(list(phrases.groups))
+                key = normalize_phrase(query)
+                ranked = sorted((distance, definition_id)
+                                for distance, phrase_key in self.fuzzy.find(key, fuzzy_distance(key))
+                                for definition_id in self.fuzzy_ids.items(phrase_key))
+            order = [definition_id for _, definition_id in ranked]
+            rows = {}
+            for start in range(0, len(order), 500):
+                chunk = order[start:start + 500]
+                for row in connection.execute(
+                        f"SELECT id, folder_id, phrase, meaning FROM definitions "
+                        f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                    rows[row[0]] = row
+            for definition_id in order:
+                if definition_id in rows:
+                    _, folder_id, phrase, meaning = rows[definition_id]
+                    yield Definition(phrase, meaning, definition_id), self.folder_paths[folder_id]
+        finally:
+            connection.close()
+
+    def duplicate_groups(self):
+        # Covers folders that were never opened, which the in-memory catalog has not seen
+        return duplicate_groups(self._iter_rows('', match_paths=False))
+
+
+def open_store(data_file, on_status=None, on_progress=None, lazy_meanings=None):
+    # lazy_meanings only applies to .snap libraries; None means LAZY_MEANINGS
+    if data_file.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteStore(data_file, on_status=on_status)
+    if data_file.lower().endswith(SNAPSHOT_EXTENSIONS):
+        return BinaryStore(data_file, on_status=on_status, on_progress=on_progress, lazy_meanings=lazy_meanings)
+    return JsonStore(data_file, on_status=on_status, on_progress=on_progress)
+
+
+def migrate(source_file, target_file):
+    # Copy a library between backends, e.g. data.json -> data.db
+    source, target = open_store(source_file), open_store(target_file)
+    try:
+        if not target.lock_writer():
+            raise RuntimeError(f'{target_file} is in use by another process')
+        target.save_tree(source.load())
+    finally:
+        source.close()
+        target.close()
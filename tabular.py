@@ -0,0 +1,143 @@
+# Helpers for importing spreadsheets (CSV/XLSX) that do not depend on Qt.
+# pandas and NumPy take longer to import than the whole GUI, so they are imported
+# inside the functions that need them rather than when the application starts.
+import os
+
+
+IMPORT_CHUNK_ROWS = 10_000
+
+
+def read_chunks(file_name, file_type, chunk_rows=IMPORT_CHUNK_ROWS):
+    # Yields (DataFrame, fraction of the file read or None) one chunk at a time
+    import pandas as pd
+
+    if file_type == 'csv':
+        total = os.path.getsize(file_name) or 1
+        with open(file_name, 'rb') as f:
+            for chunk in pd.read_csv(f, chunksize=chunk_rows):
+                yield chunk.reset_index(drop=True), min(f.tell() / total, 1.0)
+    elif file_type == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_name, read_only=True, data_only=True)
+        try:
+            # pd.read_excel reads the first sheet, not the one that was active when saved
+            sheet = workbook.worksheets[0]
+            total = sheet.max_row
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = header_names(header)
+            batch, done, blank = [], 1, []
+            for row in rows:
+                if all(cell is None for cell in row):
+                    # Empty rows at the end are only formatting and pd.read_excel left them out;
+                    # keep them back until a row with content shows they are in the middle
+                    blank.append(row)
+                    continue
+                batch.extend(blank)
+                blank = []
+                batch.append(row)
+                if len(batch) == chunk_rows:
+                    done += len(batch)
+                    yield pd.DataFrame(batch, columns=columns), done / total if total else None
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns), 1.0
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f'Unsupported file type: {file_type}')
+
+
+def header_names(header):
+    # Column names as pandas gives them: "Unnamed: <i>" for blank cells, and ".1", ".2", ...
+    # after repeated names, skipping names already in the header, so every column can be
+    # picked on its own
+    names = [f'Unnamed: {i}' if cell is None or str(cell).strip() == '' else str(cell)
+             for i, cell in enumerate(header)]
+    taken, seen, counts, columns = set(names), set(), {}, []
+    for name in names:
+        if name in seen:
+            count = counts.get(name, 0) + 1
+            while f'{name}.{count}' in taken:
+                count += 1
+            counts[name] = count
+            name = f'{name}.{count}'
+            taken.add(name)
+        seen.add(name)
+        columns.append(name)
+    return columns
+
+
+def text_column(series):
+    # Missing cells become empty strings, everything else its str() form
+    return series.astype(object).where(series.notna(), '').astype(str)
+
+
+def frame_rows(frame, phrase_col, meaning_col, mask=None):
+    # (phrase, meaning) pairs for the masked rows of a frame, skipping rows without a phrase
+    if mask is not None:
+        frame = frame[mask]
+    phrases = text_column(frame[phrase_col])
+    meanings = text_column(frame[meaning_col])
+    keep = (phrases.str.len() > 0).to_numpy()
+    return list(zip(phrases.to_numpy()[keep].tolist(), meanings.to_numpy()[keep].tolist()))
+
+
+# Row selection stored as a bitmap: one bit per row instead of one widget per row
+class RowSelection:
+    def __init__(self, length=0, selected=True):
+        self.length = 0
+        self.bits = bytearray()
+        self.resize(length, selected)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, row):
+        return bool(self.bits[row >> 3] & (1 << (row & 7)))
+
+    def __setitem__(self, row, selected):
+        if selected:
+            self.bits[row >> 3] |= 1 << (row & 7)
+        else:
+            self.bits[row >> 3] &= ~(1 << (row & 7)) & 0xFF
+
+    def resize(self, length, selected=True):
+        # Rows added by growing the selection start out selected (or not)
+        old_length = self.length
+        self.length = length
+        size = (length + 7) // 8
+        self.bits.extend(bytes(max(size - len(self.bits), 0)))
+        del self.bits[size:]
+        if length > old_length:
+            self.set_range(old_length, length, selected)
+        self._clear_padding()
+
+    def _clear_padding(self):
+        if self.length & 7:
+            self.bits[-1] &= (1 << (self.length & 7)) - 1
+
+    def set_range(self, start, stop, selected):
+        start, stop = max(start, 0), min(stop, self.length)
+        if start >= stop:
+            return
+        # Partial bytes at either end are set bit by bit, whole bytes in between by slice
+        first_full, last_full = (start + 7) >> 3, stop >> 3
+        if first_full >= last_full:
+            for row in range(start, stop):
+                self[row] = selected
+            return
+        for row in range(start, first_full << 3):
+            self[row] = selected
+        self.bits[first_full:last_full] = (b'\xff' if selected else b'\x00') * (last_full - first_full)
+        for row in range(last_full << 3, stop):
+            self[row] = selected
+
+    def mask(self):
+        # Boolean NumPy array with one entry per row
+        import numpy as np
+
+        bits = np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8), bitorder='little')
+        return bits[:self.length].astype(bool)